@@ -1,16 +1,22 @@
 import os
+import json
+import uuid
 import yaml
-from flask import Flask, render_template, request, url_for, flash, jsonify
+from flask import Flask, render_template, request, url_for, flash, jsonify, Response, abort, stream_with_context
 from werkzeug.utils import secure_filename
-from predict import predict, predict_from_video
+from predict import predict_cached, predict_from_video, iter_predict_from_video, iter_predict_from_stream
+from modules.registry import registry
+from modules.jobs import JobManager, JobQueueFull
+from modules.timing import timings
 import traceback
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, emit
 
 # Flask App Configuration
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'static/uploads/'
 app.config['EXAMPLES_FOLDER'] = 'static/examples/'
 app.secret_key = 'your_secret_key'
+DEBUG = True
 
 socketio = SocketIO(app, cors_allowed_origins="*")
 
@@ -18,6 +24,33 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['EXAMPLES_FOLDER'], exist_ok=True)
 
+def load_config(config_path='./config/config.yaml'):
+    with open(config_path, 'r') as yaml_file:
+        return yaml.safe_load(yaml_file)
+
+# Load the models once at startup, requests reuse the shared instances
+def warmup_models():
+    try:
+        config = load_config()
+        registry.warmup(config, recognizers=config.get("warmup_recognizers"))
+        registry.crop_store(config)
+    except Exception as e:
+        print(f"Model warmup failed, models will be loaded on first request: {e}")
+        traceback.print_exc()
+
+# The debug reloader imports this module in a watcher process as well, which never serves requests
+def is_serving_process():
+    return not DEBUG or __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+if is_serving_process():
+    warmup_models()
+
+# Bounded worker pool for inference, events go to the Socket.IO room of the job
+jobs = JobManager(
+    load_config().get("jobs", {"workers": 2, "max_queued": 16, "max_finished": 100}),
+    on_event=lambda event, job_id, payload: socketio.emit(event, payload, to=job_id),
+)
+
 # Helper function to check allowed file extensions
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'mp4', 'avi', 'mov', 'mkv'}
@@ -27,8 +60,31 @@ def allowed_file(filename):
 def index():
     return render_template('index.html')
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
+# Load time and memory of the cached models
+@app.route('/models')
+def models():
+    return jsonify(registry.stats()), 200
+
+# Latency per pipeline stage (p50/p95/p99), throughput since startup and result cache hits, ?reset=1 restarts the timings
+@app.route('/metrics')
+def metrics():
+    summary = timings.summary()
+    summary["result_cache"] = registry.result_cache(load_config()).stats()
+    if request.args.get('reset', type=int):
+        timings.reset()
+    return jsonify(summary), 200
+
+# Plate crops kept in memory by the crop store
+@app.route('/crops/<filename>')
+def crops(filename):
+    crop = registry.crop_store(load_config()).get(filename)
+    if crop is None:
+        abort(404)
+    data, mimetype = crop
+    return Response(data, mimetype=mimetype)
+
+# Parse the upload form into an inference config, returns (upload, None) or (None, error response)
+def parse_upload():
     # Retrieve form data
     example_choice = request.form.get('example')  # Selected example
     recognizer_choice = request.form.get('recognizer')  # Selected recognizer
@@ -38,12 +94,13 @@ def upload_file():
     # Validate recognizer selection
     if not recognizer_choice:
         flash('Please choose a recognizer.', 'danger')
-        return jsonify({'error': 'Please choose a recognizer.'}), 400
+        return None, (jsonify({'error': 'Please choose a recognizer.'}), 400)
 
     # Process uploaded file or selected example
     file = request.files.get('file')
     filename = None
     file_path = None
+    uploaded_path = None  # Removed once the request is done, examples are kept
     file_url = None
     is_video = False  # Flag to check if the file is a video
 
@@ -54,16 +111,19 @@ def upload_file():
         file_ext = os.path.splitext(file.filename)[1].lower()  # Get file extension
         if allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            # Unique name, jobs run after the response and uploads with the same name must not replace each other
+            stored_name = f"{uuid.uuid4().hex}_{filename}"
+            file_path = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
             file.save(file_path)
-            file_url = url_for('static', filename=f'uploads/{filename}')
+            uploaded_path = file_path
+            file_url = url_for('static', filename=f'uploads/{stored_name}')
 
             # Check if the uploaded file is a video
             if file_ext in VIDEO_EXTENSIONS:
                 is_video = True
         else:
             flash('Unsupported file type. Please upload an image or video.', 'danger')
-            return jsonify({'error': 'Unsupported file type. Please upload an image or video.'}), 400
+            return None, (jsonify({'error': 'Unsupported file type. Please upload an image or video.'}), 400)
     elif example_choice:
         filename = example_choice
         file_path = os.path.join(app.config['EXAMPLES_FOLDER'], filename)
@@ -75,47 +135,155 @@ def upload_file():
             is_video = True
     else:
         flash('Please upload a file or choose an example.', 'danger')
-        return jsonify({'error': 'Please upload a file or choose an example.'}), 400
+        return None, (jsonify({'error': 'Please upload a file or choose an example.'}), 400)
 
     # Load the configuration
     try:
-        with open('./config/config.yaml', 'r') as yaml_file:
-            config = yaml.safe_load(yaml_file)
+        config = load_config()
     except FileNotFoundError:
         flash('Configuration file not found.', 'danger')
-        return jsonify({'error': 'Configuration file not found.'}), 400
+        return None, (jsonify({'error': 'Configuration file not found.'}), 400)
 
     config["data_path"] = file_path
     config["recognizer"]["type"] = recognizer_choice
 
-    def progress_callback(progress):
-        # Emit progress updates to the client
-        socketio.emit('progress', {'progress': progress})
+    if is_video:
+        config["frame_interval"] = frame_interval
+        sample_fps = request.form.get('sampleFps', type=float)
+        if sample_fps:
+            config.setdefault("video", {})["sample_fps"] = sample_fps
+
+    upload = {
+        "config": config,
+        "is_video": is_video,
+        "file_url": file_url,
+        "filename": filename,
+        "recognizer": recognizer_choice,
+        "uploaded_path": uploaded_path,
+    }
+    return upload, None
+
+# Delete the uploaded file of a finished request
+def remove_upload(upload):
+    if upload["uploaded_path"]:
+        try:
+            os.remove(upload["uploaded_path"])
+        except OSError as e:
+            print(f"Removing upload {upload['uploaded_path']} failed: {e}")
 
-    # Perform inference
+@app.route('/upload', methods=['POST'])
+def upload_file():
+    upload, error = parse_upload()
+    if error:
+        return error
+    config = upload["config"]
+    is_video = upload["is_video"]
+    file_url = upload["file_url"]
+    filename = upload["filename"]
+    recognizer_choice = upload["recognizer"]
+
+    def run(progress_callback, result_callback):
+        # Perform inference
+        try:
+            if is_video:
+                return predict_from_video(config, progress_callback=progress_callback, result_callback=result_callback)
+            return predict_cached(config)
+        except Exception:
+            traceback.print_exc()
+            raise
+        finally:
+            remove_upload(upload)
+
+    # Inference runs in the job pool, the client follows the job via /jobs/<job_id> or Socket.IO
     try:
-        if is_video:
-            config["frame_interval"] = frame_interval
-            results = predict_from_video(config, progress_callback=progress_callback)
-            flash(f'Recognizer: {recognizer_choice}. Video inference completed.', 'success')
-        else:
-            results = predict(config)
-            flash(f'Recognizer: {recognizer_choice}. Image inference completed.', 'success')
-    except Exception as e:
-        flash(f'Error during inference: {str(e)}', 'danger')
-        traceback.print_exc()
-        return jsonify({'error': f'Error during inference: {str(e)}'}), 500
+        job = jobs.submit(run, meta={"file_url": file_url, "filename": filename, "recognizer": recognizer_choice})
+    except JobQueueFull as e:
+        remove_upload(upload)
+        return jsonify({'error': str(e)}), 503
 
-    # After performing inference
     data = {
+        "job_id": job.id,
         "file_url": file_url,
         "filename": filename,
-        "results": results,
+        "status_url": url_for('job_status', job_id=job.id),
     }
-    print("DATA: ", data)
-    return jsonify(data), 200
+    return jsonify(data), 202
+
+# Stream events as NDJSON or Server-Sent Events
+def stream_response(header, results, sse=False):
+    def encode(event):
+        data = json.dumps(event)
+        return f"data: {data}\n\n" if sse else f"{data}\n"
+
+    def generate():
+        yield encode(header)
+        try:
+            for result in results():
+                yield encode(result)
+        except Exception as e:
+            traceback.print_exc()
+            yield encode({'error': f'Error during inference: {str(e)}'})
+        yield encode({"done": True})
+
+    mimetype = 'text/event-stream' if sse else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+# Stream results while inference runs, as NDJSON (default) or Server-Sent Events (?format=sse)
+@app.route('/upload/stream', methods=['POST'])
+def upload_stream():
+    upload, error = parse_upload()
+    if error:
+        return error
+    config = upload["config"]
+
+    def results():
+        try:
+            if upload["is_video"]:
+                yield from iter_predict_from_video(config)
+            else:
+                yield from predict_cached(config)
+        finally:
+            remove_upload(upload)
+
+    header = {"file_url": upload["file_url"], "filename": upload["filename"]}
+    return stream_response(header, results, sse=request.args.get('format', 'ndjson') == 'sse')
+
+# Continuous inference on a live source configured under stream.sources, runs until the client disconnects
+@app.route('/live/<source>')
+def live_stream(source):
+    config = load_config()
+    sources = config["stream"]["sources"] or {}
+    if source not in sources:
+        return jsonify({'error': f'Unknown stream source: {source}'}), 404
+
+    config["data_path"] = sources[source]
+    recognizer_choice = request.args.get('recognizer')
+    if recognizer_choice:
+        config["recognizer"]["type"] = recognizer_choice
+
+    header = {"source": source}
+    return stream_response(header, lambda: iter_predict_from_stream(config), sse=request.args.get('format', 'ndjson') == 'sse')
+
+# Status, progress and (partial) results of a job, ?since=N skips the first N results
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job.'}), 404
+    since = request.args.get('since', 0, type=int)
+    return jsonify(job.to_dict(since=since)), 200
+
+# Clients join the room of their job to receive its progress and results only
+@socketio.on('join_job')
+def join_job(data):
+    join_room(data['job_id'])
+    # Events of the job before the client joined are lost, send its current state
+    job = jobs.get(data['job_id'])
+    if job is not None:
+        emit('progress', {'job_id': job.id, 'progress': job.progress})
+        emit('job_status', {'job_id': job.id, 'status': job.status, 'error': job.error})
 
 # Run the app
 if __name__ == '__main__':
-    socketio.run(app, debug=True, host='0.0.0.0', port=8080)
+    socketio.run(app, debug=DEBUG, host='0.0.0.0', port=8080)
     print("Flask app started on http://0.0.0.0:8080")
\ No newline at end of file
@@ -0,0 +1,422 @@
+import os
+
+# The benchmark runs on CPU, hide the GPUs before torch is imported
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import copy
+import json
+import platform
+import resource
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+import torch
+import yaml
+
+from eval import iter_images
+from modules.detection import LPD_Module, detector_path
+from modules.image_processing import Processing
+from modules.model_store import model_store
+from modules.ocr import OCR_Module
+from modules.registry import registry
+from modules.timing import timings
+from modules.tracking import create_tracker
+from modules.upscaling import Upscaler
+from predict import predict, iter_predict_from_video
+from utils.utils import crop_image, get_rss_bytes, match_boxes
+
+CACHE_DIR = ".cache/benchmark"
+
+
+class PeakRss:
+    """Samples the resident memory in the background, peak_mb is the maximum while active."""
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self.stop = threading.Event()
+
+    def __enter__(self):
+        self.peak = get_rss_bytes()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+        self.peak = max(self.peak, get_rss_bytes())
+
+    def sample(self):
+        while not self.stop.wait(self.interval):
+            self.peak = max(self.peak, get_rss_bytes())
+
+    @property
+    def peak_mb(self):
+        return round(self.peak / 2**20, 1)
+
+
+def latency_stats(latencies):
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000
+    if latencies.size == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "count": int(latencies.size),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def measure(function, inputs, repeats, unit):
+    """
+    Call function on every input, once untimed as warmup and then repeats times.
+    Returns latency percentiles per call, throughput in unit/s and the peak RSS.
+    Errors are reported instead of raised, e.g. for a recognizer that is not installed.
+    """
+    if not inputs:
+        return {"error": "No inputs."}
+    try:
+        function(inputs[0])
+        latencies = []
+        with PeakRss() as rss:
+            for _ in range(repeats):
+                for item in inputs:
+                    start = time.perf_counter()
+                    function(item)
+                    latencies.append(time.perf_counter() - start)
+    except Exception as e:
+        print(f"Benchmark failed: {e}")
+        return {"error": str(e)}
+
+    result = latency_stats(latencies)
+    result[f"{unit}_per_s"] = round(len(latencies) / max(sum(latencies), 1e-9), 3)
+    result["peak_rss_mb"] = rss.peak_mb
+    return result
+
+
+def load_inputs(bench_config):
+    paths = [image_path for image_path, _ in iter_images(bench_config["images"])][:bench_config["max_images"]]
+    images = [cv2.imread(image_path) for image_path in paths]
+    return [(path, image) for path, image in zip(paths, images) if image is not None]
+
+
+def benchmark_detector(config, bench_config, images):
+    detector = LPD_Module(detector_path(config), config["verbose"])
+    batch_size = config.get("detection_batch_size", 1)
+    batches = [images[start:start + batch_size] for start in range(0, len(images), batch_size)]
+
+    results = {
+        "single": measure(lambda image: detector.detect_batch([image], 1), images, bench_config["repeats"], "images"),
+        f"batch_{batch_size}": measure(lambda batch: detector.detect_batch(batch, batch_size), batches, bench_config["repeats"], "batches"),
+    }
+    # Batches are timed per call, report the throughput per image as well
+    batched = results[f"batch_{batch_size}"]
+    if "batches_per_s" in batched:
+        batched["images_per_s"] = round(batched["batches_per_s"] * len(images) / len(batches), 3)
+
+    crops = []
+    image_boxes = []
+    for image, boxes in zip(images, detector.detect_batch(images, batch_size)):
+        image_boxes.append([box.xyxy[0].cpu().numpy() for box in boxes])
+        for box in boxes:
+            crop = crop_image(image, map(int, box.xyxy[0]))
+            if crop.size > 0:
+                crops.append(crop)
+    return results, crops, image_boxes
+
+
+def benchmark_ocr(config, bench_config, crops):
+    # Recognizers read the crops after the configured upscaling and processing, as in the pipeline
+    upscaler = Upscaler(config["upscaler"])
+    processing = Processing(config["image_processing"])
+    plates = [processing(upscaler(crop)) for crop in crops]
+
+    results = {}
+    for recognizer in bench_config["recognizers"]:
+        recognizer_config = dict(config["recognizer"], type=recognizer)
+        try:
+            ocr = OCR_Module(recognizer_config, model_store(config))
+        except Exception as e:
+            print(f"Recognizer {recognizer} could not be loaded: {e}")
+            results[recognizer] = {"error": str(e)}
+            continue
+        results[recognizer] = measure(lambda plate: ocr.recognize_batch([plate]), plates, bench_config["repeats"], "plates")
+
+        # Resizing and processing as one tensor batch instead of upscaling every crop
+        if ocr.input_size is not None:
+            fused = lambda crop: ocr.recognize_tensor(processing.process_batch([crop], ocr.input_size))
+            results[f"{recognizer}_fused"] = measure(fused, crops, bench_config["repeats"], "plates")
+    return results
+
+
+def benchmark_upscalers(config, bench_config, crops):
+    results = {}
+    for mode in bench_config["upscalers"]:
+        try:
+            upscaler = Upscaler(dict(config["upscaler"], type=mode))
+        except Exception as e:
+            results[mode] = {"error": str(e)}
+            continue
+        results[mode] = measure(upscaler, crops, bench_config["repeats"], "plates")
+    return results
+
+
+def benchmark_processing(config, bench_config, crops):
+    upscaler = Upscaler(config["upscaler"])
+    plates = [upscaler(crop) for crop in crops]
+
+    # Every toggle on its own, on top of a processing config with all steps off
+    base = {key: False if isinstance(value, bool) else value for key, value in config["image_processing"].items()}
+    variants = {"none": {}}
+    variants.update(bench_config["processing"] or {})
+
+    results = {}
+    for name, toggles in variants.items():
+        processing = Processing(dict(base, **toggles))
+        results[name] = measure(processing, plates, bench_config["repeats"], "plates")
+    return results
+
+
+def simulate_tracking(images, image_boxes, bench_config, seed=0):
+    """
+    Frames and detections of a camera panning over every benchmark image for frames_per_image frames.
+    Yields (frame, detections, identities), the detections are the detected plates of the image moved
+    with the pan plus some jitter, identities the (image, plate) each detection belongs to.
+    Images are separated by one empty frame, so no track can continue on the next image.
+    """
+    rng = np.random.default_rng(seed)
+    tracking_config = bench_config["tracking"]
+    frames_per_image = bench_config["video"]["frames_per_image"]
+    for index, (image, boxes) in enumerate(zip(images, image_boxes)):
+        h, w = image.shape[:2]
+        for step in range(frames_per_image):
+            shift = step * tracking_config["pan_px"]
+            frame = cv2.warpAffine(image, np.float32([[1, 0, -shift], [0, 1, 0]]), (w, h))
+            detections = []
+            identities = []
+            for plate, box in enumerate(boxes):
+                moved = np.asarray(box, dtype=np.float64) - [shift, 0, shift, 0]
+                moved += rng.normal(0, tracking_config["jitter_px"], 4)
+                if moved[2] > 0:
+                    detections.append(moved.tolist())
+                    identities.append((index, plate))
+            yield frame, detections, identities
+        yield np.zeros_like(image), [], []
+
+
+def benchmark_trackers(config, bench_config, images, image_boxes):
+    """
+    Latency of the tracker update per frame and identity switches on the simulated pan.
+    A switch is counted whenever a plate is reported under another track ID than before,
+    coverage is the share of detections that were reported with a confirmed track.
+    """
+    results = {}
+    for tracker_type in bench_config["trackers"]:
+        try:
+            tracker = create_tracker(dict(config["tracker"], type=tracker_type))
+        except Exception as e:
+            print(f"Tracker {tracker_type} could not be loaded: {e}")
+            results[tracker_type] = {"error": str(e)}
+            continue
+
+        latencies = []
+        last_ids = {}
+        switches = 0
+        detections_count = 0
+        covered = 0
+        with PeakRss() as rss:
+            for frame, detections, identities in simulate_tracking(images, image_boxes, bench_config):
+                start = time.perf_counter()
+                tracked = tracker.update(detections, frame)
+                latencies.append(time.perf_counter() - start)
+
+                detections_count += len(detections)
+                boxes = [box for _, box in tracked]
+                for t, d, _ in match_boxes(boxes, detections, 0.5):
+                    covered += 1
+                    track_id = tracked[t][0]
+                    identity = identities[d]
+                    if identity in last_ids and last_ids[identity] != track_id:
+                        switches += 1
+                    last_ids[identity] = track_id
+
+        result = latency_stats(latencies)
+        result["frames_per_s"] = round(len(latencies) / max(sum(latencies), 1e-9), 3)
+        result["id_switches"] = switches
+        result["plates"] = sum(len(boxes) for boxes in image_boxes)
+        result["coverage"] = round(covered / max(detections_count, 1), 4)
+        result["peak_rss_mb"] = rss.peak_mb
+        results[tracker_type] = result
+    return results
+
+
+def prepare_images(paths):
+    """Directory with links to the benchmark images, so predict() only loads those."""
+    directory = os.path.join(CACHE_DIR, "images")
+    os.makedirs(directory, exist_ok=True)
+    for filename in os.listdir(directory):
+        os.remove(os.path.join(directory, filename))
+    for path in paths:
+        os.symlink(os.path.abspath(path), os.path.join(directory, os.path.basename(path)))
+    return directory
+
+
+def make_synthetic_video(images, video_config):
+    """
+    Video of the benchmark images, each letterboxed to the video size and shown for
+    frames_per_image frames. Written once per set of images and settings.
+    """
+    width, height = video_config["width"], video_config["height"]
+    name = f"synthetic_{len(images)}_{width}x{height}_{video_config['frames_per_image']}.mp4"
+    path = os.path.join(CACHE_DIR, name)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), video_config["fps"], (width, height))
+    try:
+        for image in images:
+            h, w = image.shape[:2]
+            scale = min(width / w, height / h)
+            resized = cv2.resize(image, (int(w * scale), int(h * scale)))
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            top = (height - resized.shape[0]) // 2
+            left = (width - resized.shape[1]) // 2
+            frame[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+            for _ in range(video_config["frames_per_image"]):
+                writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+def run_end_to_end(name, run, unit):
+    """Run the pipeline once, stage latencies and throughput come from the shared timings."""
+    timings.reset()
+    try:
+        with PeakRss() as rss:
+            start = time.perf_counter()
+            results = run()
+            elapsed = time.perf_counter() - start
+    except Exception as e:
+        print(f"End-to-end benchmark {name} failed: {e}")
+        return {"error": str(e)}
+
+    summary = timings.summary()
+    processed = summary["processed"].get(unit, 0)
+    plates = sum(1 for result in results if result.get("lp_text"))
+    return {
+        "elapsed_s": round(elapsed, 3),
+        unit: processed,
+        "results": len(results),
+        f"{unit}_per_s": round(processed / elapsed, 3),
+        "plates_per_s": round(plates / elapsed, 3),
+        "stages": summary["stages"],
+        "peak_rss_mb": rss.peak_mb,
+    }
+
+
+def benchmark_end_to_end(config, bench_config, inputs):
+    # Model loading is not part of the measurement
+    registry.warmup(config)
+    results = {}
+
+    image_config = copy.deepcopy(config)
+    image_config["data_path"] = prepare_images([path for path, _ in inputs])
+    image_config["visualize"] = False
+    results["images"] = run_end_to_end("images", lambda: predict(image_config), "images")
+
+    video_config = copy.deepcopy(config)
+    video_config["data_path"] = make_synthetic_video([image for _, image in inputs], bench_config["video"])
+    video_config["frame_interval"] = 1
+    video_config.setdefault("video", {})["sample_fps"] = None
+    results["video"] = run_end_to_end("video", lambda: list(iter_predict_from_video(video_config)), "frames")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(config, bench_config):
+    if bench_config.get("threads"):
+        torch.set_num_threads(bench_config["threads"])
+
+    inputs = load_inputs(bench_config)
+    images = [image for _, image in inputs]
+    print(f"Benchmarking on {len(images)} images, {torch.get_num_threads()} threads")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "opencv": cv2.__version__,
+            "cpu": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "threads": torch.get_num_threads(),
+            "images": len(images),
+            "repeats": bench_config["repeats"],
+            "config": config,
+        },
+        "modules": {},
+    }
+
+    print("Detector...")
+    report["modules"]["detector"], crops, image_boxes = benchmark_detector(config, bench_config, images)
+    report["meta"]["plates"] = len(crops)
+    print("Recognizers...")
+    report["modules"]["ocr"] = benchmark_ocr(config, bench_config, crops)
+    print("Upscalers...")
+    report["modules"]["upscaler"] = benchmark_upscalers(config, bench_config, crops)
+    print("Processing...")
+    report["modules"]["processing"] = benchmark_processing(config, bench_config, crops)
+    print("Trackers...")
+    report["modules"]["tracker"] = benchmark_trackers(config, bench_config, images, image_boxes)
+
+    if bench_config["end_to_end"]:
+        print("End to end...")
+        report["end_to_end"] = benchmark_end_to_end(config, bench_config, inputs)
+
+    # ru_maxrss is in KiB on Linux
+    report["meta"]["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return report
+
+
+def print_report(report, prefix=""):
+    for key, value in report.items():
+        if key in ("meta", "stages") or not isinstance(value, dict):
+            continue
+        scalars = {k: v for k, v in value.items() if not isinstance(v, dict)}
+        if scalars:
+            print(f"{prefix}{key}: " + ", ".join(f"{k}={v}" for k, v in scalars.items()))
+        print_report(value, f"{prefix}{key}.")
+
+
+def main():
+    with open('./config/config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+    with open('./config/benchmark.yaml', 'r') as file:
+        bench_config = yaml.safe_load(file)
+
+    report = run_benchmark(config, bench_config)
+    print_report(report)
+
+    os.makedirs(bench_config["output_dir"], exist_ok=True)
+    path = os.path.join(bench_config["output_dir"], f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
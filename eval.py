@@ -6,118 +6,260 @@ import yaml
 import torch
 import re
 import unicodedata
-from modules.detection import LPD_Module
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from modules.detection import LPD_Module, detector_path
 from modules.ocr import OCR_Module
 from modules.upscaling import Upscaler
 from modules.image_processing import Processing
-from utils.utils import normalize_text, crop_image
-
-def levenshtein_distance(a, b):
-    m, n = len(a), len(b)
-    dp = [[0] * (n + 1) for _  in range(m + 1)]
-    for i in range(m + 1):
-        dp[i][0] = i
-    for j in range(n + 1):
-        dp[0][j] = j
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            cost = 0 if a[i - 1] == b[j - 1] else 1
-            dp[i][j] = min(dp[i - 1][j] + 1, dp[i][j - 1] + 1, dp[i - 1][j - 1] + cost)
-    return dp[m][n]
-
-def character_error_rate(gt, pred):
-    if len(gt) == 0:
-        return float('inf')
-    return levenshtein_distance(gt, pred) / len(gt)
-
-def word_error_rate(gt, pred):
-    gt_words = gt.split()
-    pred_words = pred.split()
-    if len(gt_words) == 0:
-        return float('inf')
-    return levenshtein_distance(gt_words, pred_words) / len(gt_words)
-
-def load_images_and_labels(directory_path):
-    image_list = []
-
-    # Load images
-    for filename in os.listdir(directory_path):
+from modules.detection_cache import DetectionCache
+from modules.model_store import model_store
+from modules.timing import StageTimer
+from utils.utils import normalize_text, plate_images, file_hash, match_boxes, yolo_label_boxes, box_bounds
+from utils import metrics
+
+def iter_images(directory_path):
+    """Yield (image_path, label) for every test image, the label is the file name."""
+    for filename in sorted(os.listdir(directory_path)):
         if filename.endswith('.jpg'):
             image_path = os.path.join(directory_path, filename)
-            img = cv2.imread(image_path)
-            if img is not None:
-                # Match the image filename (without extension) to its label
-                image_name = os.path.splitext(filename)[0]
-                #correct_label = labels.get(image_name, "Unknown")
-                image_list.append((img, image_name))
+            image_name = os.path.splitext(filename)[0]
+            yield image_path, image_name
+
+def detect_images(config, images, timer=None):
+    """
+    Yield (image_path, label, boxes) with boxes as [[x1, y1, x2, y2], ...],
+    or as 4 corners [[x, y], ...] per box for OBB detectors.
+    Boxes are cached on disk, the detector is only loaded for images that are not cached yet.
+    timer: optional StageTimer for reading and detecting uncached images (detect_read and detect stages).
+    """
+    timer = timer or StageTimer()
+    eval_config = config["eval"]
+    batch_size = config.get("detection_batch_size", 1)
+    cache = DetectionCache(eval_config["cache_dir"], detector_path(config)) if eval_config["use_cache"] else None
+    detector = None
+    pending = []
+
+    def detect_pending():
+        nonlocal detector
+        if detector is None:
+            detector = LPD_Module(detector_path(config), config["verbose"])
+        # The workers decode every image again for OCR, only their reads are the decode stage
+        with timer.time("detect_read", len(pending)):
+            loaded = [(entry, cv2.imread(entry[0])) for entry in pending]
+        loaded = [(entry, image) for entry, image in loaded if image is not None]
+        with timer.time("detect", len(loaded)):
+            boxes_per_image = detector.detect_batch([image for _, image in loaded], batch_size)
+        for ((image_path, label, image_hash), _), boxes in zip(loaded, boxes_per_image):
+            boxes = detector.corners(boxes).tolist() if detector.obb else [box.xyxy[0].tolist() for box in boxes]
+            if cache:
+                cache.put(image_hash, boxes)
+            yield image_path, label, boxes
+
+    for image_path, label in images:
+        image_hash = file_hash(image_path) if cache else None
+        boxes = cache.get(image_hash) if cache else None
+        if boxes is not None:
+            yield image_path, label, boxes
+            continue
+
+        pending.append((image_path, label, image_hash))
+        if len(pending) >= batch_size:
+            yield from detect_pending()
+            pending = []
+    if pending:
+        yield from detect_pending()
+
+# Recognition modules of a worker process, created by init_worker
+_worker = {}
+
+def init_worker(config, threads):
+    # Split the cores between the workers instead of every worker using all of them
+    torch.set_num_threads(threads)
+    _worker["ocr"] = OCR_Module(config["recognizer"], model_store(config))
+    _worker["upscaler"] = Upscaler(config["upscaler"])
+    _worker["image_processing"] = Processing(config["image_processing"])
+    _worker["label_path"] = config["label_path"]
+    _worker["eval"] = config["eval"]
+
+def labeled_boxes(image, label, boxes, label_path, eval_config):
+    """
+    Assign the detections one-to-one to the ground truth boxes of the YOLO label file.
+    Returns the boxes to read, only the assigned ones with eval.match_labels and all of them otherwise,
+    and (ground truth boxes, assigned detections), or all boxes and None without a label file.
+    """
+    label_file = os.path.join(label_path, f"{label}.txt")
+    if image is None or not os.path.exists(label_file):
+        return boxes, None
+    height, width = image.shape[:2]
+    gt_boxes = yolo_label_boxes(label_file, width, height)
+    matches = match_boxes(gt_boxes, [box_bounds(box) for box in boxes], eval_config["match_iou"])
+    if eval_config.get("match_labels", False):
+        boxes = [boxes[j] for _, j, _ in matches]
+    return boxes, (len(gt_boxes), len(matches))
+
+def timed(timings, stage, function, *args):
+    """Call function and add its duration to timings[stage]."""
+    start = time.perf_counter()
+    result = function(*args)
+    timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+    return result
+
+def crop_plates(image, boxes, input_size, timings):
+    """
+    Plate images of the detected boxes, returns (plates, rectified).
+    OBB plates are rectified from their corners straight to the recognizer input size.
+    """
+    rectified = bool(boxes) and np.asarray(boxes[0]).shape == (4, 2)
+    try:
+        # Crop the image to simplify ocr
+        plates = timed(timings, "crop", plate_images, image, boxes, input_size)
+    except Exception as e:
+        print(e)
+        plates = []
+    return plates, rectified
+
+def upscale_plates(plates, rectified, input_size, upscaler, fused, timings):
+    """
+    Upscale the plates, unless the fused path resizes the whole batch or the plates were
+    rectified straight to the recognizer input size. Without an input size (EasyOCR,
+    tesseract) rectified plates keep their size in the image and are upscaled as well.
+    """
+    if fused or (rectified and input_size is not None):
+        return plates
+    lp_images = []
+    for lp_image in plates:
+        try:
+            lp_images.append(timed(timings, "upscale", upscaler, lp_image))
+        except Exception as e:
+            print(e)
+            continue
+    return lp_images
+
+def process_plates(lp_images, rectified, image_processing, fused, timings):
+    """Process the upscaled plates, unless the fused path processes the whole batch."""
+    if fused:
+        return lp_images
+    processed = []
+    for lp_image in lp_images:
+        try:
+            processed.append(timed(timings, "preprocess", image_processing, lp_image, rectified))
+        except Exception as e:
+            print(e)
+            continue
+    return processed
 
-    return image_list
+def prepare_plates(plates, rectified, input_size, upscaler, image_processing, fused, timings):
+    """Upscale and process the plates, unless the fused path does it on the whole batch."""
+    lp_images = upscale_plates(plates, rectified, input_size, upscaler, fused, timings)
+    return process_plates(lp_images, rectified, image_processing, fused, timings)
+
+def read_prepared_plates(ocr, image_processing, lp_images, fused, rectified, timings):
+    """Texts of the plates prepared by prepare_plates."""
+    if fused and lp_images:
+        batch = timed(timings, "preprocess", image_processing.process_batch, lp_images, ocr.input_size, rectified)
+        ocr_results = timed(timings, "ocr", ocr.recognize_tensor, batch)
+    else:
+        ocr_results = timed(timings, "ocr", ocr.recognize_batch, lp_images)
+    return [lp_text for lp_text, _ in ocr_results]
+
+def recognize_plates(task):
+    """
+    Crop, upscale, process and read the detected plates of one image.
+    Also returns the seconds per stage for the image, the worker has no access to the timer of the main process,
+    and the number of labeled and detected plates.
+    """
+    image_path, label, boxes = task
+    # Only stages that ran are reported, zeros would pull the percentiles down
+    timings = {}
+
+    ocr = _worker["ocr"]
+    image_processing = _worker["image_processing"]
+    fused = image_processing.fused and ocr.input_size is not None
+
+    image = timed(timings, "decode", cv2.imread, image_path)
+    boxes, detection = labeled_boxes(image, label, boxes, _worker["label_path"], _worker["eval"])
+    plates, rectified = crop_plates(image, boxes, ocr.input_size, timings)
+    lp_images = prepare_plates(plates, rectified, ocr.input_size, _worker["upscaler"], image_processing, fused, timings)
+
+    # Text recognition
+    predictions = read_prepared_plates(ocr, image_processing, lp_images, fused, rectified, timings)
+    return image_path, label, predictions, timings, detection
+
+def score_predictions(label, predictions, verbose=False):
+    """
+    Compare the texts read from one image with its label.
+    Returns the best (cer, wer, text) over all plates, or None if no plate could be read.
+    """
+    gt_normalized = normalize_text(label)
+    gt = re.sub(r'[^A-Z0-9]', '', gt_normalized)
+
+    texts = []
+    for lp_text in predictions:
+        if "OCR failed" in lp_text:
+            continue
+        lp_text_normalized = normalize_text(lp_text)
+        text_filtered = re.sub(r'[^A-Z0-9]', '', lp_text_normalized)
+        text_filtered = re.sub(r'([A-Z0-9])\1{4}', lambda m: m.group(1) * 4, text_filtered)
+
+        if verbose:
+            print(lp_text)
+            print("Predicted: ", text_filtered)
+            print("GT: ", gt)
+            print("Correct: ", gt == text_filtered)
+        texts.append(text_filtered)
+
+    if not texts:
+        return None
+    # All plates of the image are scored at once
+    cers = metrics.character_error_rates(texts, [gt] * len(texts))
+    wers = metrics.word_error_rates(texts, [gt] * len(texts))
+    best = int(np.argmin(cers))
+    return float(cers[best]), float(wers.min()), texts[best]
+
+def print_breakdown(title, groups):
+    print(f"=== Accuracy by {title} ===")
+    for key, group in groups.items():
+        print(f"{key}: {group['accuracy']:.3f} ({group['count']} plates)")
 
 def test(config):
-    images = load_images_and_labels(config["data_path"])
-    detector = LPD_Module(config["lpd_checkpoint_path"], config["verbose"])
-    ocr = OCR_Module(config["recognizer"])
-    upscaler = Upscaler(config["upscaler"])
-    image_processing = Processing(config["image_processing"])
+    eval_config = config["eval"]
+    workers = eval_config["workers"]
 
     total_cer = 0
     total_wer = 0
     total_cases = 0
     total_correct = 0
+    total_missed = 0
+    labeled_plates = 0
+    detected_plates = 0
+    # Label, ground truth and best prediction of every scored image for the breakdowns
+    labels = []
+    ground_truths = []
+    best_predictions = []
+    timer = StageTimer()
 
-    for i, image_and_label in enumerate(images):
-        image = image_and_label[0]
-        try:
-            boxes = detector(image)
-            if not boxes:  # No license plates detected
-                continue
-        except Exception as e:
-            continue
-        cers = []
-        wers = []
-        for j, box in enumerate(boxes):
-            try:
-                # Crop the image to simplify ocr
-                xyxy = map(int, box.xyxy[0])
-                lp_image = crop_image(image, xyxy)
-
-                # Save the cropped image
-                cropped_image_path = f'static/uploads/cropped_plate_{i}_{j}.png'
-                cv2.imwrite(cropped_image_path, lp_image)
-
-                # Upscaling
-                lp_image = upscaler(lp_image)
-
-                # Processing
-                lp_image = image_processing(lp_image)
-
-                # Text recognition
-                lp_text, confidence = ocr(lp_image)
-
-                print(lp_text)
-                lp_text_normalized = normalize_text(lp_text)
-                text_filtered = re.sub(r'[^A-Z0-9]', '', lp_text_normalized)
-                text_filtered = re.sub(r'([A-Z0-9])\1{4}', lambda m: m.group(1) * 4, text_filtered)
-
-                gt_normalized = normalize_text(image_and_label[1])
-                gt = re.sub(r'[^A-Z0-9]', '', gt_normalized)
-           
-                print("Predicted: ", text_filtered)
-                print("GT: ", gt)
-                print("Correct: ", gt == text_filtered)
-
-                cer = character_error_rate(gt, text_filtered)
-                cers.append(cer)
-                wer = word_error_rate(gt, text_filtered)
-                wers.append(wer)
-            
-            except Exception as e:
-                print(e)
-                continue
-        
-
-        cer = min(cers)
-        wer = min(wers)
+    def score(result):
+        nonlocal total_cer, total_wer, total_cases, total_correct, total_missed, labeled_plates, detected_plates
+        image_path, label, predictions, timings, detection = result
+        timer.merge(timings)
+        timer.count("images")
+        if detection is not None:
+            labeled_plates += detection[0]
+            detected_plates += detection[1]
+        scores = score_predictions(label, predictions, verbose=True)
+
+        # No plate detected or no plate could be read
+        if scores is None:
+            total_missed += 1
+            return
+
+        cer, wer, text = scores
+        labels.append(label)
+        ground_truths.append(re.sub(r'[^A-Z0-9]', '', normalize_text(label)))
+        best_predictions.append(text)
         print("CER: ", cer)
         print("WER: ", wer)
         print("")
@@ -127,9 +269,27 @@ def test(config):
         if wer == 0:
             total_correct += 1
 
+    tasks = detect_images(config, iter_images(config["data_path"]), timer)
+    threads = max(1, (os.cpu_count() or 1) // max(workers, 1))
 
+    if workers <= 0:
+        # Everything in this process, e.g. for debugging
+        init_worker(config, torch.get_num_threads())
+        for task in tasks:
+            score(recognize_plates(task))
+    else:
+        # Spawn instead of fork, torch and CUDA are not fork-safe
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=(config, threads)) as pool:
+            # Submit while detecting, but only keep a few images per worker in flight
+            in_flight = deque()
+            for task in tasks:
+                in_flight.append(pool.submit(recognize_plates, task))
+                while len(in_flight) > 4 * workers:
+                    score(in_flight.popleft().result())
+            while in_flight:
+                score(in_flight.popleft().result())
 
-        
     if total_cases > 0:
         avg_cer = total_cer / total_cases
         avg_wer = total_wer / total_cases
@@ -139,8 +299,19 @@ def test(config):
         print("Average WER: ", avg_wer)
         print("Overall Accuracy: ", overall_accuracy)
         print("Overall Character Accuracy: ", 1.0 - avg_cer)
+        print("Images without a readable plate: ", total_missed)
+        if labeled_plates > 0:
+            print(f"Detection recall (IoU >= {eval_config['match_iou']}): {detected_plates / labeled_plates:.3f} ({detected_plates}/{labeled_plates})")
+
+        print_breakdown("plate length", metrics.accuracy_by_length(best_predictions, ground_truths))
+        print_breakdown("plate format", metrics.accuracy_by_format(best_predictions, ground_truths, labels))
+        chars, matrix = metrics.confusion_matrix(best_predictions, ground_truths)
+        print("=== Most frequent character errors (ground truth -> predicted) ===")
+        for gt_char, pred_char, count in metrics.top_confusions(chars, matrix):
+            print(f"{gt_char or '-'} -> {pred_char or '-'}: {count}")
     else:
         print("No detections were processed.")
+    timer.print_summary()
 
 
 
@@ -0,0 +1,152 @@
+import json
+import os
+
+import cv2
+import torch
+import yaml
+from ultralytics import YOLO
+
+from eval import detect_images, iter_images
+from modules.detection import EXPORT_SUFFIXES
+from modules.model_store import model_store
+from modules.ocr import OCR_Module
+from modules.upscaling import Upscaler
+from modules.image_processing import Processing
+from utils.utils import plate_images
+
+
+class ParseqExport(torch.nn.Module):
+    """
+    Parseq with softmax output for export. Decoding always runs for the full label length,
+    the early exit once every sample reached EOS is data dependent and would be traced
+    with the step count of the dummy input. Texts end at the first EOS either way.
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self.max_length = model.hparams.get("max_label_length", 25)
+
+    def forward(self, images):
+        return self.model(images, max_length=self.max_length).softmax(-1)
+
+
+def export_parseq(config):
+    recognizer_config = config["recognizer"]
+    export_config = config["export"]
+    path = recognizer_config["parseq_onnx_path"]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    store = model_store(config)
+    if store is not None:
+        model = store.parseq().eval()
+    else:
+        model = torch.hub.load('baudm/parseq', 'parseq', pretrained=True).eval()
+    img_size = recognizer_config["parseq_img_size"]
+    dummy = torch.rand(2, 3, *img_size)
+
+    torch.onnx.export(
+        ParseqExport(model),
+        dummy,
+        path,
+        input_names=["images"],
+        output_names=["probabilities"],
+        dynamic_axes={"images": {0: "batch"}, "probabilities": {0: "batch"}},
+        opset_version=export_config["opset"],
+    )
+
+    # Everything the ONNX recognizer needs besides the graph, so it does not need torch.hub
+    tokenizer = model.tokenizer
+    meta = {
+        "charset": list(tokenizer._itos),
+        "eos_id": tokenizer.eos_id,
+        "img_size": img_size,
+    }
+    with open(os.path.splitext(path)[0] + ".json", "w") as file:
+        json.dump(meta, file)
+    print(f"Parseq exported to {path}")
+
+    if export_config["quantize"]:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantized_path = path.replace(".onnx", ".int8.onnx")
+        quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+        print(f"Quantized model written to {quantized_path}")
+
+
+def verify_parseq(config):
+    """Compare the decoded texts of the exported models with the torch.hub model on plates of the test set."""
+    upscaler = Upscaler(config["upscaler"])
+    processing = Processing(config["image_processing"])
+    plates = []
+    for image_path, _, boxes in detect_images(config, iter_images(config["data_path"])):
+        image = cv2.imread(image_path)
+        for crop in plate_images(image, boxes):
+            if crop.size > 0:
+                plates.append(processing(upscaler(crop)))
+        if len(plates) >= config["export"]["verify_plates"]:
+            break
+    if not plates:
+        print("No plates to verify the export.")
+        return
+
+    reference = OCR_Module(dict(config["recognizer"], type="parseq"), model_store(config)).recognize_batch(plates, char_confidences=True)
+    variants = [False, True] if config["export"]["quantize"] else [False]
+    for quantized in variants:
+        ocr = OCR_Module(dict(config["recognizer"], type="parseq_onnx", onnx_quantized=quantized))
+        results = ocr.recognize_batch(plates, char_confidences=True)
+        same = sum(1 for (text, _, _), (ref_text, _, _) in zip(results, reference) if text == ref_text)
+        max_diff = max(abs(confidence - ref_confidence) for (_, confidence, _), (_, ref_confidence, _) in zip(results, reference))
+        name = "int8" if quantized else "fp32"
+        print(f"ONNX {name}: {same}/{len(plates)} texts identical, max. confidence difference {max_diff:.4f}")
+
+
+def export_detector(config):
+    """Export the detector next to its checkpoint, in every format of export.detector_formats."""
+    export_config = config["export"]
+    model = YOLO(config["lpd_checkpoint_path"])
+    paths = {}
+    for detector_format in export_config["detector_formats"]:
+        if detector_format == "openvino_int8":
+            # Calibrated on the val split of the dataset (data/valid), dynamic for batches of detection_batch_size
+            path = model.export(format="openvino", int8=True, data=export_config["detector_data"], imgsz=export_config["imgsz"], dynamic=True)
+        elif detector_format in EXPORT_SUFFIXES and detector_format != "pt":
+            path = model.export(format=detector_format, imgsz=export_config["imgsz"], dynamic=True)
+        else:
+            raise ValueError(f"Unsupported detector format: {detector_format}")
+        paths[detector_format] = str(path)
+        print(f"Detector exported as {detector_format} to {path}")
+    return paths
+
+
+def verify_detector(config, paths):
+    """
+    Compare mAP and plate recall of the exported detectors with the .pt checkpoint on the test split.
+    Exported models run on CPU, so does the reference.
+    """
+    export_config = config["export"]
+    models = {"pt": config["lpd_checkpoint_path"], **paths}
+    rows = []
+    for detector_format, path in models.items():
+        metrics = YOLO(path).val(data=export_config["detector_data"], split="test", imgsz=export_config["imgsz"], device="cpu", plots=False, verbose=False)
+        rows.append((detector_format, metrics.box.map50, metrics.box.map, metrics.box.mr))
+
+    print(f"{'format':<16}{'mAP50':>10}{'mAP50-95':>10}{'recall':>10}{'delta mAP50':>14}")
+    reference = rows[0][1]
+    for detector_format, map50, map50_95, recall in rows:
+        print(f"{detector_format:<16}{map50:>10.4f}{map50_95:>10.4f}{recall:>10.4f}{map50 - reference:>+14.4f}")
+
+
+def main():
+    with open('./config/config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+
+    targets = config["export"]["targets"]
+    if "parseq" in targets:
+        export_parseq(config)
+        verify_parseq(config)
+    if "detector" in targets:
+        paths = export_detector(config)
+        verify_detector(config, paths)
+
+if __name__ == "__main__":
+    main()
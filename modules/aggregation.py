@@ -0,0 +1,143 @@
+import re
+import threading
+from collections import defaultdict
+
+import cv2
+
+
+class TrackState:
+    def __init__(self):
+        self.frames = []
+        self.last_position = 0  # Position of the last sighting among the processed frames
+        self.boxes = []
+        self.readings = []  # (text, char_confidences)
+        self.best = None  # Reading with the highest confidence
+        self.ocr_area = 0
+        self.ocr_sharpness = 0.0
+
+
+class TrackAggregator:
+    """
+    Per-track recognition cache for the video path.
+
+    Every sighting of a track is recorded, but OCR only runs until the track has a
+    stable reading, and afterwards only if the crop gets clearly larger or sharper.
+    At the end all readings of a track are combined into one plate string by
+    character-level voting over the OCR confidences.
+    """
+    def __init__(self, config):
+        self.enabled = config["enabled"]
+        self.stable_readings = config["stable_readings"]
+        self.stable_confidence = config["stable_confidence"]
+        self.improvement_factor = config["improvement_factor"]
+        self.tracks = {}
+        self.lock = threading.Lock()
+
+    def observe(self, track_id, frame_index, position, box, crop):
+        """
+        Record a sighting of a track. Returns True if the crop should be recognized.
+        position: number of frames processed before this one, the frame index can skip
+        any number of frames on live streams.
+        """
+        if not self.enabled:
+            return True
+
+        area = crop.shape[0] * crop.shape[1]
+        sharpness = self.sharpness(crop)
+
+        with self.lock:
+            track = self.tracks.setdefault(track_id, TrackState())
+            track.frames.append(frame_index)
+            track.last_position = position
+            track.boxes.append(box)
+
+            if self.is_stable(track):
+                improved = (area >= track.ocr_area * self.improvement_factor
+                            or sharpness >= track.ocr_sharpness * self.improvement_factor)
+                if not improved:
+                    return False
+
+            track.ocr_area = max(track.ocr_area, area)
+            track.ocr_sharpness = max(track.ocr_sharpness, sharpness)
+            return True
+
+    def add_reading(self, track_id, reading):
+        """reading: dict with at least lp_text, confidence and char_confidences"""
+        with self.lock:
+            track = self.tracks.setdefault(track_id, TrackState())
+            track.readings.append((reading["lp_text"], reading["char_confidences"]))
+            if track.best is None or reading["confidence"] > track.best["confidence"]:
+                track.best = reading
+
+    def is_stable(self, track):
+        if len(track.readings) < self.stable_readings:
+            return False
+        _, consensus = self.vote(track.readings)
+        return consensus >= self.stable_confidence
+
+    def results(self):
+        """One result per track that has at least one reading."""
+        with self.lock:
+            return [self.track_result(track_id, track) for track_id, track in self.tracks.items() if track.best is not None]
+
+    def finished(self, position, max_gap):
+        """
+        Remove tracks that were not seen for more than max_gap processed frames and return their results.
+        Keeps memory flat on long videos, finished tracks are reported right away.
+        """
+        results = []
+        with self.lock:
+            for track_id in list(self.tracks):
+                track = self.tracks[track_id]
+                if track.frames and position - track.last_position > max_gap:
+                    del self.tracks[track_id]
+                    if track.best is not None:
+                        results.append(self.track_result(track_id, track))
+        return results
+
+    def track_result(self, track_id, track):
+        lp_text, consensus = self.vote(track.readings)
+        result = {key: value for key, value in track.best.items() if key != "char_confidences"}
+        result.update({
+            "track_id": int(track_id),
+            "lp_text": lp_text,
+            "text_filtered": re.sub(r'(?<!\s)[^A-Z0-9-\s](?!\s)', ' ', lp_text),
+            "consensus": consensus,
+            "readings": len(track.readings),
+            "frames": list(track.frames),
+            "boxes": list(track.boxes),
+        })
+        return result
+
+    @staticmethod
+    def vote(readings):
+        """
+        Combine readings into one text. The most supported length wins, then every
+        position takes the character with the highest summed confidence.
+        Returns the text and its mean per-character support (0-1).
+        """
+        by_length = defaultdict(list)
+        for text, char_confidences in readings:
+            if text and len(text) == len(char_confidences):
+                by_length[len(text)].append((text, char_confidences))
+        if not by_length:
+            return "", 0.0
+
+        length = max(by_length, key=lambda n: sum(sum(confidences) for _, confidences in by_length[n]))
+        candidates = by_length[length]
+
+        text = ""
+        support = 0.0
+        for position in range(length):
+            votes = defaultdict(float)
+            for candidate, confidences in candidates:
+                votes[candidate[position]] += confidences[position]
+            char, score = max(votes.items(), key=lambda vote: vote[1])
+            text += char
+            support += score / len(candidates)
+        return text, support / length
+
+    @staticmethod
+    def sharpness(image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        return cv2.Laplacian(gray, cv2.CV_64F).var()
@@ -0,0 +1,132 @@
+import os
+import queue
+import threading
+from collections import OrderedDict, deque
+
+import cv2
+
+
+class CropStore:
+    """
+    Keeps the plate crops shown in the web interface.
+
+    disk:       write synchronously into directory (previous behaviour)
+    async_disk: write from a background thread, inference does not wait for disk I/O
+    memory:     keep the last max_items crops in an LRU, served by the /crops route
+    none:       do not keep crops
+
+    Disk modes delete the oldest files once more than max_items crops were written.
+    """
+    MIMETYPES = {"png": "image/png", "jpg": "image/jpeg", "webp": "image/webp"}
+
+    def __init__(self, config):
+        self.mode = config["type"]
+        self.directory = config["directory"]
+        self.format = config["format"]
+        self.max_items = config["max_items"]
+        self.lock = threading.Lock()
+        # Crops in memory are gone after a restart, the others are still there (or there are none)
+        self.persistent = self.mode != "memory"
+
+        if self.format == "jpg":
+            self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, config["quality"]]
+        elif self.format == "webp":
+            self.encode_params = [cv2.IMWRITE_WEBP_QUALITY, config["quality"]]
+        elif self.format == "png":
+            self.encode_params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+        else:
+            raise ValueError(f"Unsupported crop format: {self.format}")
+
+        if self.mode == "disk":
+            self.forward = self.save_disk
+        elif self.mode == "async_disk":
+            self.forward = self.save_async
+            self.queue = queue.Queue(maxsize=config.get("queue_size", 256))
+            self.writer = threading.Thread(target=self.write_loop, daemon=True)
+            self.writer.start()
+        elif self.mode == "memory":
+            self.forward = self.save_memory
+            self.crops = OrderedDict()
+        elif self.mode == "none":
+            self.forward = lambda name, image: None
+        else:
+            raise ValueError(f"Unsupported crop store: {self.mode}")
+
+        if self.mode in ("disk", "async_disk"):
+            os.makedirs(self.directory, exist_ok=True)
+            # Files of earlier runs count towards the retention limit as well
+            existing = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.startswith("crop_")]
+            self.files = deque(sorted(existing, key=os.path.getmtime))
+
+    def __call__(self, name, image):
+        return self.save(name, image)
+
+    def save(self, name, image):
+        """Store a crop, returns the URL/path to show it or None."""
+        return self.forward(f"crop_{name}.{self.format}", image)
+
+    def save_disk(self, filename, image):
+        path = os.path.join(self.directory, filename)
+        self.write(path, image)
+        return path
+
+    def save_async(self, filename, image):
+        path = os.path.join(self.directory, filename)
+        try:
+            self.queue.put_nowait((path, image))
+        except queue.Full:
+            # The writer fell behind, drop the crop instead of stalling inference
+            print(f"Crop writer queue full, dropping {filename}")
+            return None
+        return path
+
+    def save_memory(self, filename, image):
+        with self.lock:
+            self.crops[filename] = image
+            self.crops.move_to_end(filename)
+            while len(self.crops) > self.max_items:
+                self.crops.popitem(last=False)
+        return f"/crops/{filename}"
+
+    def write_loop(self):
+        while True:
+            path, image = self.queue.get()
+            try:
+                self.write(path, image)
+            except Exception as e:
+                print(f"Writing crop {path} failed: {e}")
+
+    def write(self, path, image):
+        cv2.imwrite(path, image, self.encode_params)
+        with self.lock:
+            self.files.append(path)
+            while len(self.files) > self.max_items:
+                old_path = self.files.popleft()
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+    def exists(self, path):
+        """Whether a URL/path returned by save() can still be served, None (no crop) always can."""
+        if path is None:
+            return True
+        if self.mode == "memory":
+            with self.lock:
+                return os.path.basename(path) in self.crops
+        return os.path.exists(path)
+
+    def get(self, filename):
+        """Encoded crop and its mimetype from the memory store, or None if it was evicted."""
+        if self.mode != "memory":
+            return None
+        with self.lock:
+            image = self.crops.get(filename)
+            if image is None:
+                return None
+            self.crops.move_to_end(filename)
+        # Crops are only encoded when they are actually requested
+        ok, buffer = cv2.imencode(f".{self.format}", image, self.encode_params)
+        if not ok:
+            return None
+        return buffer.tobytes(), self.MIMETYPES[self.format]
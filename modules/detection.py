@@ -1,21 +1,95 @@
+import os
+import numpy as np
 import torch
 from ultralytics import YOLO
 
+# Exported detector formats, file names as written by YOLO.export next to the .pt checkpoint
+EXPORT_SUFFIXES = {
+    "pt": ".pt",
+    "onnx": ".onnx",
+    "openvino": "_openvino_model",
+    "openvino_int8": "_int8_openvino_model",
+}
+
+def detector_path(config):
+    """Path of the detector in the configured format (lpd_format), derived from lpd_checkpoint_path."""
+    path = config["lpd_checkpoint_path"]
+    detector_format = config.get("lpd_format", "pt")
+    if detector_format not in EXPORT_SUFFIXES:
+        raise ValueError(f"Unsupported detector format: {detector_format}")
+    return os.path.splitext(path)[0] + EXPORT_SUFFIXES[detector_format]
+
 class LPD_Module:
     def __init__(self, model_path, verbose=False):
         self.model = YOLO(model_path, verbose=verbose)
 
-        if torch.cuda.is_available():
-            self.model.to('cuda')
-        else:
-            self.model.to('cpu')
+        # Exported models (ONNX, OpenVINO) are not torch modules and pick their device themselves
+        if model_path.endswith(".pt"):
+            if torch.cuda.is_available():
+                self.model.to('cuda')
+            else:
+                self.model.to('cpu')
+
+        # Oriented boxes (runs/obb): every box also has its 4 corners in xyxyxyxy
+        self.obb = self.model.task == "obb"
  
     def __call__(self, images):
         results = self.model(source=images, device=self.model.device)
         boxes = []
         for result in results:
-            for box in result.boxes:
+            for box in self.result_boxes(result):
                 #plate_box = self.crop_image_tensor(images, box)
                 boxes.append(box)
         return boxes
 
+    def detect_batch(self, images, batch_size=8):
+        """
+        Run detection on a list of images, batch_size images per forward pass.
+        Returns one list of boxes per input image, in input order.
+        """
+        boxes_per_image = []
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            results = self.model(source=batch, device=self.model.device)
+            for result in results:
+                boxes_per_image.append(self.result_boxes(result))
+        return boxes_per_image
+
+    def detect_regions(self, images, regions, batch_size=8):
+        """
+        Like detect_batch, but only on the region (x1, y1, x2, y2) of every image.
+        Boxes are returned in the coordinates of the full image.
+        """
+        crops = [image[y1:y2, x1:x2] for image, (x1, y1, x2, y2) in zip(images, regions)]
+        boxes_per_image = []
+        for image, (x1, y1, _, _), boxes in zip(images, regions, self.detect_batch(crops, batch_size)):
+            boxes_per_image.append(self.shift_boxes(boxes, x1, y1, image.shape[:2]))
+        return boxes_per_image
+
+    def result_boxes(self, result):
+        # OBB boxes also provide xyxy (the axis-aligned bounds), so callers can treat both alike
+        return list(result.obb if self.obb else result.boxes)
+
+    def shift_boxes(self, boxes, dx, dy, shape):
+        """Move boxes detected on a crop by (dx, dy) into an image of the given shape"""
+        if not boxes or (dx == 0 and dy == 0):
+            return boxes
+        shifted = []
+        for box in boxes:
+            data = box.data.clone()
+            if self.obb:
+                # OBB rows start with the center: cx, cy, w, h, rotation
+                data[:, 0] += dx
+                data[:, 1] += dy
+            else:
+                data[:, [0, 2]] += dx
+                data[:, [1, 3]] += dy
+            shifted.append(type(box)(data, shape))
+        return shifted
+
+    @staticmethod
+    def corners(boxes):
+        """Corners of OBB boxes as (N, 4, 2)"""
+        if not boxes:
+            return np.zeros((0, 4, 2), dtype=np.float32)
+        return np.stack([box.xyxyxyxy[0].cpu().numpy() for box in boxes])
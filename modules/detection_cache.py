@@ -0,0 +1,34 @@
+import json
+import os
+
+from utils.utils import file_hash
+
+
+class DetectionCache:
+    """
+    On-disk cache of detector outputs, keyed by checkpoint hash and image hash.
+    Changing the recognizer or the image processing reuses the cached boxes,
+    a new checkpoint gets its own cache directory.
+    """
+    def __init__(self, cache_dir, checkpoint_path):
+        self.directory = os.path.join(cache_dir, file_hash(checkpoint_path)[:16])
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, image_hash):
+        return os.path.join(self.directory, f"{image_hash}.json")
+
+    def get(self, image_hash):
+        """Cached boxes as [[x1, y1, x2, y2], ...], or None if the image was not detected yet."""
+        try:
+            with open(self.path(image_hash), 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, image_hash, boxes):
+        # Write to a temporary file first, so an interrupted run never leaves a broken entry
+        path = self.path(image_hash)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(boxes, file)
+        os.replace(tmp_path, path)
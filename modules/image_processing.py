@@ -1,5 +1,7 @@
 import cv2
 import numpy as np
+import torch
+import torch.nn.functional as F
 
 class Processing:
     def __init__(self, config):
@@ -11,8 +13,10 @@ class Processing:
         self.threshold_value = config["threshold_value"]
         self.rotation = config["rotation"]
         self.max_angle = config["max_rotation_angle"]
+        self.fused = config.get("fused", False)
 
-    def __call__(self, image):
+    def __call__(self, image, rectified=False):
+        """rectified: the plate was already warped from its OBB corners, rotation is skipped"""
 
         if(self.denoising):
             image = self.denoise(image)
@@ -23,7 +27,7 @@ class Processing:
         #image = self.sharpen(image)
         if(self.enhance_contrast):
             image = self.contrast(image)
-        if(self.rotation):
+        if(self.rotation and not rectified):
             image = self.rotate(image)
         if(self.thresholding):
             image = self.threshold(image)
@@ -33,6 +37,94 @@ class Processing:
 
         return image
 
+    def process_batch(self, images, size, rectified=False):
+        """
+        Fused path for recognizers with a fixed input size (Parseq): every crop is resized
+        straight to size (h, w) without upscaling, then the enabled steps run on the whole
+        batch as tensor ops. Grayscale stays single-channel and is only expanded as a view.
+        Contrast, thresholding and rotation have no tensor version and run per crop on the small images.
+        rectified: see __call__.
+        Returns a float tensor (N, 3, h, w) in [0, 1].
+        """
+        h, w = size
+        batch = np.empty((len(images), h, w, 3), dtype=np.uint8)
+        for i, image in enumerate(images):
+            interpolation = cv2.INTER_AREA if image.shape[0] > h else cv2.INTER_CUBIC
+            batch[i] = cv2.resize(image, (w, h), interpolation=interpolation)
+        x = torch.from_numpy(batch).permute(0, 3, 1, 2).float()
+
+        if(self.denoising):
+            x = self.denoise_batch(x)
+        if(self.normalization):
+            x = self.normalize_batch(x)
+        if(self.use_grayscale):
+            x = self.grayscale_batch(x)
+        rotate = self.rotation and not rectified
+        if(self.enhance_contrast or rotate or self.thresholding):
+            x = self.per_image(x, rotate)
+        # Scale before expanding, so grayscale batches stay a view of one channel. The recognizer
+        # normalizes that channel only (OCR_Module.ocr_parseq_tensor), the model input is the first dense copy.
+        x = x / 255.0
+        if(self.use_grayscale):
+            x = x.expand(-1, 3, -1, -1)
+        return x
+
+    def per_image(self, x, rotate):
+        # Steps without a tensor version, on the uint8 images of the batch
+        images = x.round().clamp(0, 255).to(torch.uint8).permute(0, 2, 3, 1).numpy()
+        processed = []
+        for image in images:
+            image = image[..., 0] if self.use_grayscale else np.ascontiguousarray(image)
+            if(self.enhance_contrast):
+                image = self.contrast(image)
+            if(rotate):
+                image = self.rotate(image)
+            if(self.thresholding):
+                image = self.threshold(image)
+            processed.append(image[..., None] if image.ndim == 2 else image)
+        return torch.from_numpy(np.stack(processed)).permute(0, 3, 1, 2).float()
+
+    @staticmethod
+    def denoise_batch(x, diameter=7, sigma_color=1.0, sigma_space=1.0):
+        # Bilateral filter like cv2.bilateralFilter(image, 7, 1, 1), on (N, C, H, W) in 0-255
+        n, c, h, w = x.shape
+        radius = diameter // 2
+        padded = F.pad(x, (radius, radius, radius, radius), mode="reflect")
+        patches = F.unfold(padded, diameter).view(n, c, diameter * diameter, h, w)
+        # OpenCV uses the sum of the absolute channel differences as color distance
+        color = (patches - x.unsqueeze(2)).abs().sum(1, keepdim=True)
+        offsets = torch.arange(-radius, radius + 1, dtype=torch.float32)
+        space = (offsets.view(-1, 1) ** 2 + offsets.view(1, -1) ** 2).view(1, 1, -1, 1, 1)
+        weights = torch.exp(-space / (2 * sigma_space ** 2) - color ** 2 / (2 * sigma_color ** 2))
+        # Only the circular neighbourhood of the diameter, as in OpenCV
+        weights = weights * (space <= radius ** 2)
+        return (weights * patches).sum(2) / weights.sum(2)
+
+    @staticmethod
+    def normalize_batch(x):
+        # Min-max to 0-255 per image, like cv2.normalize with NORM_MINMAX
+        low = x.amin(dim=(1, 2, 3), keepdim=True)
+        high = x.amax(dim=(1, 2, 3), keepdim=True)
+        return ((x - low) * 255.0 / (high - low).clamp_min(1e-6)).round()
+
+    @staticmethod
+    def grayscale_batch(x):
+        # BGR to gray and histogram equalization per image, (N, 1, H, W)
+        b, g, r = x[:, 0:1], x[:, 1:2], x[:, 2:3]
+        gray = (0.114 * b + 0.587 * g + 0.299 * r).round().clamp(0, 255)
+
+        n = gray.shape[0]
+        values = gray.reshape(n, -1).long()
+        hist = torch.zeros(n, 256).scatter_add_(1, values, torch.ones(values.shape))
+        cdf = hist.cumsum(1)
+        total = cdf[:, -1:]
+        # cdf of the first non-empty bin maps to 0
+        cdf_min = torch.where(hist > 0, cdf, total).amin(1, keepdim=True)
+        lut = ((cdf - cdf_min) * 255.0 / (total - cdf_min).clamp_min(1)).round().clamp(0, 255)
+        equalized = lut.gather(1, values).view_as(gray)
+        # Images with a single gray value are left as they are
+        return torch.where((total == cdf_min).view(n, 1, 1, 1), gray, equalized)
+
     def grayscale(self, image):
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         gray = cv2.equalizeHist(gray)
@@ -64,7 +156,7 @@ class Processing:
         return image
 
     def rotate(self, image):
-        # Switch to OBB branch instead!
+        # Not used for OBB detectors, their plates are rectified from the corners
         grayscale = image if self.use_grayscale else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
 
         # Edge detection
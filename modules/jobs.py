@@ -0,0 +1,103 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, meta=None):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"  # queued, running, done, failed
+        self.progress = 0
+        self.results = []
+        self.error = None
+        self.meta = meta or {}
+        self.created = time.time()
+        self.finished = None
+
+    def to_dict(self, since=0):
+        """since: only include results from this index on, for incremental polling"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "results": self.results[since:],
+            "result_count": len(self.results),
+            "error": self.error,
+            **self.meta,
+        }
+
+
+class JobManager:
+    """
+    Runs inference jobs on a bounded worker pool.
+
+    run functions are called as run(progress_callback, result_callback) and return
+    the final results. Status changes, progress and partial results are passed to
+    on_event(event, job_id, payload), e.g. to forward them to a Socket.IO room.
+    """
+    def __init__(self, config, on_event=None):
+        self.max_queued = config["max_queued"]
+        self.max_finished = config["max_finished"]
+        self.executor = ThreadPoolExecutor(max_workers=config["workers"])
+        self.on_event = on_event
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, run, meta=None):
+        with self.lock:
+            queued = sum(1 for job in self.jobs.values() if job.status == "queued")
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"Too many queued jobs ({queued}), try again later.")
+            job = Job(meta)
+            self.jobs[job.id] = job
+            self.prune()
+        self.executor.submit(self.run, job, run)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def run(self, job, run):
+        job.status = "running"
+        self.emit("job_status", job, {"status": job.status})
+
+        def progress_callback(progress):
+            job.progress = progress
+            self.emit("progress", job, {"progress": progress})
+
+        def result_callback(results):
+            job.results.extend(results)
+            self.emit("job_results", job, {"results": results})
+
+        try:
+            results = run(progress_callback, result_callback)
+            # The final results replace the partial ones (e.g. aggregated tracks)
+            job.results = results if results is not None else []
+            job.progress = 100
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            print(f"Job {job.id} failed: {e}")
+        job.finished = time.time()
+        self.emit("job_status", job, {"status": job.status, "error": job.error})
+
+    def emit(self, event, job, payload):
+        if self.on_event:
+            try:
+                self.on_event(event, job.id, dict(payload, job_id=job.id))
+            except Exception as e:
+                print(f"Emitting {event} for job {job.id} failed: {e}")
+
+    def prune(self):
+        # Keep only the most recent finished jobs
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self.jobs[job_id]
@@ -0,0 +1,113 @@
+import json
+import os
+
+import torch
+
+from utils.utils import file_hash
+
+
+class ChecksumError(Exception):
+    pass
+
+
+class ModelStore:
+    """
+    Local copies of every downloaded model: Parseq (torch.hub repo and weights),
+    EasyOCR and the pretrained YOLO weights.
+
+    prefetch() downloads everything into the store directory and writes a manifest
+    with the SHA-256 of every file. The loaders only read from the directory, check
+    the files against the manifest and never touch the network.
+    """
+    MANIFEST = "manifest.json"
+
+    def __init__(self, config):
+        self.directory = config["directory"]
+        self.verify_checksums = config["verify"]
+        self.yolo_weights = config["yolo_weights"]
+        self.easyocr_languages = config["easyocr_languages"]
+        self.hub_dir = os.path.join(self.directory, "torch_hub")
+        self.easyocr_dir = os.path.join(self.directory, "easyocr")
+        self.yolo_dir = os.path.join(self.directory, "yolo")
+
+    def prefetch(self):
+        """Download all models into the store and record their checksums."""
+        import easyocr
+        from ultralytics.utils.downloads import attempt_download_asset
+
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = {}
+
+        torch.hub.set_dir(self.hub_dir)
+        torch.hub.load('baudm/parseq', 'parseq', pretrained=True, trust_repo=True)
+        manifest["parseq"] = self.checksums(self.hub_dir)
+        print("Parseq stored")
+
+        os.makedirs(self.easyocr_dir, exist_ok=True)
+        easyocr.Reader(self.easyocr_languages, model_storage_directory=self.easyocr_dir, download_enabled=True)
+        manifest["easyocr"] = self.checksums(self.easyocr_dir)
+        print("EasyOCR stored")
+
+        os.makedirs(self.yolo_dir, exist_ok=True)
+        for name in self.yolo_weights:
+            attempt_download_asset(os.path.join(self.yolo_dir, name))
+            manifest[name] = self.checksums(self.yolo_dir, [name])
+            print(f"{name} stored")
+
+        with open(os.path.join(self.directory, self.MANIFEST), 'w') as file:
+            json.dump(manifest, file, indent=2)
+        print(f"Manifest written to {os.path.join(self.directory, self.MANIFEST)}")
+
+    def parseq(self):
+        self.verify("parseq", self.hub_dir)
+        torch.hub.set_dir(self.hub_dir)
+        # The repo was cloned by prefetch, the weights are found in the hub checkpoint directory
+        repo_dirs = [name for name in os.listdir(self.hub_dir) if name.startswith("baudm_parseq")]
+        if not repo_dirs:
+            raise FileNotFoundError(f"Parseq is not in the model store {self.directory}, run prefetch.py first.")
+        repo = os.path.join(self.hub_dir, sorted(repo_dirs)[0])
+        return torch.hub.load(repo, 'parseq', source='local', pretrained=True)
+
+    def easyocr_reader(self, languages):
+        import easyocr
+
+        self.verify("easyocr", self.easyocr_dir)
+        return easyocr.Reader(languages, model_storage_directory=self.easyocr_dir, download_enabled=False)
+
+    def yolo_path(self, name):
+        """Local path of pretrained YOLO weights such as yolo11n-obb.pt."""
+        self.verify(name, self.yolo_dir)
+        return os.path.join(self.yolo_dir, name)
+
+    def verify(self, name, directory):
+        if not self.verify_checksums:
+            return
+        manifest_path = os.path.join(self.directory, self.MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No manifest in the model store {self.directory}, run prefetch.py first.")
+        with open(manifest_path, 'r') as file:
+            expected = json.load(file).get(name)
+        if expected is None:
+            raise FileNotFoundError(f"{name} is not in the model store {self.directory}, run prefetch.py first.")
+
+        actual = self.checksums(directory, list(expected))
+        for path, checksum in expected.items():
+            if actual.get(path) != checksum:
+                raise ChecksumError(f"Checksum mismatch for {name}: {path}")
+
+    @staticmethod
+    def checksums(directory, files=None):
+        """{relative path: sha256} of the given files, or of all files below directory."""
+        if files is None:
+            files = sorted(os.path.relpath(os.path.join(root, name), directory)
+                           for root, _, names in os.walk(directory) for name in names)
+        return {path: file_hash(os.path.join(directory, path)) for path in files
+                if os.path.isfile(os.path.join(directory, path))}
+
+
+def model_store(config):
+    """ModelStore of a config, or None if models are loaded from their online sources."""
+    store_config = config.get("model_store")
+    if not store_config or not store_config["enabled"]:
+        return None
+    return ModelStore(store_config)
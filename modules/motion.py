@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Decides per frame whether the detector has to run, for fixed cameras that mostly see an empty lane.
+
+    Frames are converted to grayscale and downscaled, then compared with the previous frame
+    (diff) or a background model (mog2). Only changes inside the ROI polygon count. Detection
+    runs on frames with motion and for hold_frames frames after it, so a car that stops at
+    the gate is still tracked, and at least every max_skip frames as a fallback.
+    With crop, the detector only sees the bounding rectangle of the ROI.
+    """
+    def __init__(self, config):
+        self.enabled = config["enabled"]
+        self.method = config["method"]
+        if self.method not in ("diff", "mog2"):
+            raise ValueError(f"Unsupported motion gate method: {self.method}")
+        self.roi = np.asarray(config["roi"], dtype=np.float32).reshape(-1, 2) if config["roi"] else None
+        self.crop = config["crop"]
+        self.width = config["width"]
+        self.threshold = config["threshold"]
+        self.min_changed = config["min_changed"]
+        self.hold_frames = config["hold_frames"]
+        self.max_skip = config["max_skip"]
+
+        self.previous = None
+        self.subtractor = None
+        self.mask = None
+        self.roi_pixels = 1
+        self.region = None
+        self.since_motion = None
+        self.skipped = 0
+
+    def __call__(self, frame):
+        """
+        Returns None if detection can be skipped for this frame, otherwise the region
+        (x1, y1, x2, y2) of the frame to run the detector on.
+        """
+        if not self.enabled:
+            return 0, 0, frame.shape[1], frame.shape[0]
+
+        small = self.downscale(frame)
+        if self.mask is None or self.mask.shape != small.shape:
+            self.setup(frame.shape, small.shape)
+
+        if self.motion(small):
+            self.since_motion = 0
+        elif self.since_motion is not None:
+            self.since_motion += 1
+
+        active = self.since_motion is not None and self.since_motion <= self.hold_frames
+        if not active and (self.max_skip is None or self.skipped < self.max_skip):
+            self.skipped += 1
+            return None
+        self.skipped = 0
+        return self.region
+
+    def downscale(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        scale = self.width / gray.shape[1]
+        small = cv2.resize(gray, (self.width, max(1, round(gray.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def setup(self, frame_shape, small_shape):
+        """ROI mask at the downscaled size and the detector region at full size"""
+        height, width = frame_shape[:2]
+        self.mask = np.zeros(small_shape, dtype=np.uint8)
+        if self.roi is None:
+            self.mask[:] = 1
+            self.region = (0, 0, width, height)
+        else:
+            scale = small_shape[1] / width
+            cv2.fillPoly(self.mask, [np.round(self.roi * scale).astype(np.int32)], 1)
+            x, y, w, h = cv2.boundingRect(self.roi)
+            x1, y1 = max(0, x), max(0, y)
+            x2, y2 = min(width, x + w), min(height, y + h)
+            self.region = (x1, y1, x2, y2) if self.crop else (0, 0, width, height)
+        self.roi_pixels = max(int(self.mask.sum()), 1)
+        self.previous = None
+        self.subtractor = None
+        self.since_motion = None
+
+    def motion(self, small):
+        if self.method == "mog2":
+            if self.subtractor is None:
+                self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+            changed = self.subtractor.apply(small) > 0
+        else:
+            if self.previous is None:
+                # The first frame is always checked
+                self.previous = small
+                return True
+            changed = cv2.absdiff(small, self.previous) > self.threshold
+            self.previous = small
+        return np.count_nonzero(changed & (self.mask > 0)) / self.roi_pixels >= self.min_changed
@@ -4,13 +4,22 @@ import easyocr
 from torchvision import transforms as T
 import matplotlib.pyplot as plt
 import os
+import json
 import subprocess
+import threading
+import numpy as np
+from modules.tesseract import TesseractPool
 
 class OCR_Module:
-    def __init__(self, config):
+    def __init__(self, config, store=None):
+        """store: optional ModelStore, Parseq and EasyOCR are then loaded offline from it"""
         self.config = config
         self.model_name = self.config["type"]
         self.model = None
+        self.input_size = None  # Fixed (h, w) input of tensor recognizers, see recognize_tensor
+        # Only the torch models (Parseq, EasyOCR) run one forward pass at a time, the instance is shared
+        # between threads. The tesseract pool and ONNX Runtime sessions are thread-safe and run in parallel.
+        self.lock = threading.Lock()
         
 
         # Tesseract for windows
@@ -41,43 +50,89 @@ class OCR_Module:
             except pytesseract.TesseractNotFoundError:
                 print("Tesseract is not installed or not added to the PATH.")
             self.forward = self.ocr_tesseract
-            tesseract_oem = config["tesseract_engine"]
-            tesseract_psm = config["tesseract_segmentation"]
-            self.tesseract_config = f'--oem {tesseract_oem} --psm {tesseract_psm}'
+            self.tesseract = TesseractPool(config)
 
 
 
         # EasyOCR
         elif self.model_name == "easyocr":
-            self.model = easyocr.Reader([self.config["language"]])
+            if store is not None:
+                self.model = store.easyocr_reader([self.config["language"]])
+            else:
+                self.model = easyocr.Reader([self.config["language"]])
             self.forward = self.ocr_easyocr
         
         # Parseq
         elif self.model_name == "parseq":
-            self.model = torch.hub.load('baudm/parseq', 'parseq', pretrained=True).eval()
+            if store is not None:
+                self.model = store.parseq().eval()
+            else:
+                self.model = torch.hub.load('baudm/parseq', 'parseq', pretrained=True).eval()
             self.forward = self.ocr_parseq
             self.img_size = self.config["parseq_img_size"]
+            self.input_size = tuple(self.img_size)
+            self.resize, self.normalize = self.get_parseq_transform(self.img_size).transforms
+
+        # Parseq exported by export.py, runs in ONNX Runtime without torch.hub
+        elif self.model_name == "parseq_onnx":
+            self.session, self.charset, self.eos_id, self.img_size = self.load_parseq_onnx(self.config)
+            self.input_name = self.session.get_inputs()[0].name
+            self.forward = self.ocr_parseq
+            self.input_size = tuple(self.img_size)
+            self.resize, self.normalize = self.get_parseq_transform(self.img_size).transforms
+
+        else:
+            raise ValueError(f"Unsupported recognizer: {self.model_name}")
 
     def __call__(self, image):
         return self.forward(image)
+
+    def recognize_batch(self, images, char_confidences=False):
+        """
+        Recognize a list of plate crops. Returns one (text, confidence) tuple per crop,
+        or (text, confidence, per-character confidences) if char_confidences is set.
+        Parseq runs all crops in a single forward pass, tesseract in its worker pool, EasyOCR loops.
+        """
+        if len(images) == 0:
+            return []
+        if self.input_size is not None:
+            results = self.ocr_parseq_batch(images)
+        elif self.model_name == "tesseract":
+            results = self.tesseract.recognize(images)
+        else:
+            # EasyOCR does not score single characters, use the word confidence for each of them
+            results = []
+            for image in images:
+                text, confidence = self.forward(image)
+                results.append((text, confidence, [confidence] * len(text)))
+
+        if char_confidences:
+            return results
+        return [(text, confidence) for text, confidence, _ in results]
+
+    def recognize_tensor(self, batch, char_confidences=False):
+        """
+        Recognize a batch that is already resized to input_size, e.g. from Processing.process_batch.
+        batch: float tensor (N, 3, h, w) in [0, 1]. Returns the same tuples as recognize_batch.
+        """
+        if self.input_size is None:
+            raise ValueError(f"Tensor input is not supported by recognizer: {self.model_name}")
+        if len(batch) == 0:
+            return []
+        results = self.ocr_parseq_tensor(batch, list(range(len(batch))), len(batch))
+        if char_confidences:
+            return results
+        return [(text, confidence) for text, confidence, _ in results]
     
     def ocr_tesseract(self, image):
-        try:
-            plate_text = pytesseract.image_to_string(image, config=self.tesseract_config)
-            print(f"Tesseract OCR result: {plate_text}")
-            if not plate_text.strip():  # Kein Text erkannt
-                raise ValueError("No text detected.")
-            
-            confidence = 1
-            return plate_text.strip(), confidence
-        except Exception as e:
-            print(f"Tesseract OCR failed: {e}")  # Debugging-Ausgabe
-            return "OCR failed: No text detected or invalid input."
+        text, confidence, _ = self.tesseract.recognize([image])[0]
+        return text, confidence
 
 
     def ocr_easyocr(self, image):
         try:
-            results = self.model.readtext(image)
+            with self.lock:
+                results = self.model.readtext(image)
             if not results or len(results) == 0:  # Kein Text erkannt
                 raise ValueError("No text detected.")
             label = " ".join([result[1] for result in results])
@@ -85,37 +140,107 @@ class OCR_Module:
             return label, confidence
         except Exception as e:
             print(f"EasyOCR failed: {e}")  # Debugging-Ausgabe
-            return "OCR failed: No text detected or invalid input."
+            return "OCR failed: No text detected or invalid input.", 0.0
         
 
     def ocr_parseq(self, image):
-        try:
-            img = torch.tensor(image, dtype=torch.float32).permute(2, 0, 1)
-            img /= 255.0
-            
-            transform = self.get_parseq_transform(self.img_size)
-            img = transform(img).unsqueeze(0)
+        text, confidence, _ = self.ocr_parseq_batch([image])[0]
+        return text, confidence
 
-            logits = self.model(img)
-            pred = logits.softmax(-1)
-            label, confidence = self.model.tokenizer.decode(pred)
-            confidence_mean = confidence[0].mean().item()
+    def ocr_parseq_batch(self, images):
+        # Resize every crop to the model input size, so they can be stacked into one tensor
+        tensors = []
+        indices = []
+        for i, image in enumerate(images):
+            try:
+                img = torch.from_numpy(image).permute(2, 0, 1).float() / 255.0
+                tensors.append(self.resize(img))
+                indices.append(i)
+            except Exception as e:
+                print(f"Parseq OCR failed: {e}")  # Debugging-Ausgabe
 
-            if not label or len(label[0].strip()) == 0:  # Kein Text erkannt
-                raise ValueError("No text detected.")
-            
-            filtered_text = ""
-            for i, (char, conf) in enumerate(zip(label[0], confidence[0])):
-                if conf < 0.5:
-                    continue
-                if i in [1, 2, 3] and conf < 0.6:
-                    continue
-                filtered_text += char
-            
-            return filtered_text, confidence_mean
+        if not tensors:
+            return [self.failed()] * len(images)
+        return self.ocr_parseq_tensor(torch.stack(tensors), indices, len(images))
+
+    def ocr_parseq_tensor(self, batch, indices, count):
+        """batch: resized crops in [0, 1], indices: position of every crop among the count results"""
+        results = [self.failed()] * count
+        try:
+            if batch.shape[1] == 3 and batch.stride(1) == 0:
+                # Grayscale batch expanded from one channel (Processing.process_batch), normalize that channel only
+                batch = self.normalize(batch[:, :1]).expand(-1, 3, -1, -1)
+            else:
+                batch = self.normalize(batch)
+            if self.model_name == "parseq_onnx":
+                # ONNX Runtime needs a dense array, the expanded view is copied here
+                pred = self.session.run(None, {self.input_name: batch.contiguous().numpy()})[0]
+                labels, confidences = self.decode_onnx(pred)
+            else:
+                with self.lock, torch.inference_mode():
+                    logits = self.model(batch)
+                    pred = logits.softmax(-1)
+                    labels, confidences = self.model.tokenizer.decode(pred)
         except Exception as e:
             print(f"Parseq OCR failed: {e}")  # Debugging-Ausgabe
-            return "OCR failed: No text detected or invalid input."
+            return results
+
+        for i, label, confidence in zip(indices, labels, confidences):
+            if not label or len(label.strip()) == 0:  # Kein Text erkannt
+                print("Parseq OCR failed: No text detected.")
+                continue
+            filtered_text, char_confidences = self.filter_characters(label, confidence)
+            results[i] = (filtered_text, confidence.mean().item(), char_confidences)
+        return results
+
+    def decode_onnx(self, pred):
+        """
+        Greedy decoding of the exported model output (N, T, classes), like the Parseq tokenizer:
+        the text ends before the first EOS, the confidences include the one of the EOS token.
+        """
+        ids = pred.argmax(-1)
+        probs = pred.max(-1)
+        labels = []
+        confidences = []
+        for sample_ids, sample_probs in zip(ids.tolist(), probs):
+            eos = sample_ids.index(self.eos_id) if self.eos_id in sample_ids else len(sample_ids)
+            labels.append("".join(self.charset[i] for i in sample_ids[:eos]))
+            confidences.append(sample_probs[:eos + 1])
+        return labels, confidences
+
+    @staticmethod
+    def load_parseq_onnx(config):
+        import onnxruntime as ort
+
+        path = config["parseq_onnx_path"]
+        if config.get("onnx_quantized"):
+            path = path.replace(".onnx", ".int8.onnx")
+        # Charset and input size are written next to the model by export.py
+        with open(os.path.splitext(config["parseq_onnx_path"])[0] + ".json", "r") as file:
+            meta = json.load(file)
+
+        options = ort.SessionOptions()
+        threads = config.get("onnx_threads", 0)
+        if threads:
+            options.intra_op_num_threads = threads
+        session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        return session, meta["charset"], meta["eos_id"], meta["img_size"]
+
+    @staticmethod
+    def failed():
+        return ("OCR failed: No text detected or invalid input.", 0.0, [])
+
+    def filter_characters(self, label, confidence):
+        filtered_text = ""
+        char_confidences = []
+        for i, (char, conf) in enumerate(zip(label, confidence.tolist())):
+            if conf < 0.5:
+                continue
+            if i in [1, 2, 3] and conf < 0.6:
+                continue
+            filtered_text += char
+            char_confidences.append(conf)
+        return filtered_text, char_confidences
     
     def get_parseq_transform(self, img_size: tuple[int] = (32, 128)):
         transforms = []
@@ -0,0 +1,119 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class VideoPipeline:
+    """
+    Staged video inference with bounded queues between the stages:
+
+        decode thread -> detection/tracking thread -> recognition worker pool
+
+    read_frame():                       returns (frame_index, frame) or None at the end of the stream
+    detect_batch(frames):               returns one list of boxes per frame
+    track(frame_index, frame, boxes):   runs sequentially in frame order, returns a job for recognize
+    recognize(job):                     runs in the worker pool, returns the results of one frame
+
+    Results are yielded per frame in frame order. A full queue blocks the stage
+    before it, so a slow stage throttles decoding instead of buffering the video.
+    """
+    _END = object()
+
+    def __init__(self, read_frame, detect_batch, track, recognize, batch_size=8, queue_size=16, workers=2):
+        self.read_frame = read_frame
+        self.detect_batch = detect_batch
+        self.track = track
+        self.recognize = recognize
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.workers = workers
+
+    def run(self):
+        frames = queue.Queue(maxsize=self.queue_size)
+        pending = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+
+        def put(q, item):
+            # Block while the next stage is full, but give up once the pipeline stops
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return self._END
+
+        def decode():
+            try:
+                while not stop.is_set():
+                    item = self.read_frame()
+                    if item is None:
+                        break
+                    if not put(frames, item):
+                        return
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(frames, self._END)
+
+        def detect(executor):
+            try:
+                done = False
+                while not done:
+                    # Collect up to batch_size frames, without waiting for a full batch at the end
+                    batch = []
+                    item = get(frames)
+                    while item is not self._END:
+                        batch.append(item)
+                        if len(batch) >= self.batch_size:
+                            break
+                        try:
+                            item = frames.get_nowait()
+                        except queue.Empty:
+                            break
+                    done = item is self._END
+
+                    if not batch:
+                        continue
+
+                    boxes_per_frame = self.detect_batch([frame for _, frame in batch])
+                    for (frame_index, frame), boxes in zip(batch, boxes_per_frame):
+                        job = self.track(frame_index, frame, boxes)
+                        future = executor.submit(self.recognize, job)
+                        if not put(pending, (frame_index, future)):
+                            return
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(pending, self._END)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            decoder = threading.Thread(target=decode, daemon=True)
+            detector = threading.Thread(target=detect, args=(executor,), daemon=True)
+            decoder.start()
+            detector.start()
+            try:
+                while True:
+                    item = get(pending)
+                    if item is self._END:
+                        break
+                    frame_index, future = item
+                    yield frame_index, future.result()
+            finally:
+                stop.set()
+                decoder.join()
+                detector.join()
+
+        if errors:
+            raise errors[0]
@@ -0,0 +1,167 @@
+import copy
+import json
+import threading
+import time
+
+from modules.detection import LPD_Module, detector_path
+from modules.ocr import OCR_Module
+from modules.upscaling import Upscaler
+from modules.image_processing import Processing
+from modules.crop_store import CropStore
+from modules.result_cache import ResultCache
+from modules.model_store import model_store
+from utils.utils import get_rss_bytes
+
+
+class InferenceLock:
+    """
+    Wraps a shared model so only one thread runs it at a time. The ultralytics predictor
+    keeps state per call and is not thread-safe, but jobs, streamed uploads and live
+    streams all use the same detector from the registry.
+    Methods of the model run under the lock, other attributes are passed through.
+    OCR_Module locks only its torch forward passes itself, see OCR_Module.lock.
+    """
+    def __init__(self, model):
+        self._model = model
+        self._lock = threading.RLock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            return self._model(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._model, name)
+        if not callable(attr) or getattr(attr, "__self__", None) is not self._model:
+            return attr
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of the pipeline modules.
+
+    Models are keyed by their checkpoint path / config, so every request that
+    uses the same settings gets the same instance instead of reloading YOLO,
+    Parseq or EasyOCR from disk.
+    """
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, key, factory):
+        entry = (kind, key)
+        model = self._models.get(entry)
+        if model is not None:
+            return model
+
+        # One lock per entry, so different models can still load in parallel
+        with self._lock:
+            entry_lock = self._locks.setdefault(entry, threading.Lock())
+
+        with entry_lock:
+            model = self._models.get(entry)
+            if model is None:
+                rss_before = get_rss_bytes()
+                start = time.perf_counter()
+                model = factory()
+                load_time = time.perf_counter() - start
+                rss_delta = max(get_rss_bytes() - rss_before, 0)
+
+                self._models[entry] = model
+                self._stats[entry] = {
+                    "kind": kind,
+                    "key": key,
+                    "load_time_s": round(load_time, 3),
+                    "rss_delta_mb": round(rss_delta / 2**20, 1),
+                    "param_mb": round(self._parameter_bytes(model) / 2**20, 1),
+                }
+                print(f"Loaded {kind} ({key}) in {load_time:.2f}s")
+        return model
+
+    def detector(self, config):
+        path = detector_path(config)
+        verbose = config["verbose"]
+        return self.get("detector", path, lambda: InferenceLock(LPD_Module(path, verbose=verbose)))
+
+    def ocr(self, config):
+        recognizer_config = copy.deepcopy(config["recognizer"])
+        key = self._config_key(recognizer_config)
+        store = model_store(config)
+        return self.get("ocr", key, lambda: OCR_Module(recognizer_config, store))
+
+    def upscaler(self, config):
+        upscaler_config = copy.deepcopy(config["upscaler"])
+        key = self._config_key(upscaler_config)
+        return self.get("upscaler", key, lambda: Upscaler(upscaler_config))
+
+    def processing(self, config):
+        processing_config = copy.deepcopy(config["image_processing"])
+        key = self._config_key(processing_config)
+        return self.get("processing", key, lambda: Processing(processing_config))
+
+    def crop_store(self, config):
+        store_config = copy.deepcopy(config["crop_store"])
+        key = self._config_key(store_config)
+        return self.get("crop_store", key, lambda: CropStore(store_config))
+
+    def result_cache(self, config):
+        cache_config = copy.deepcopy(config["result_cache"])
+        key = self._config_key(cache_config)
+        return self.get("result_cache", key, lambda: ResultCache(cache_config))
+
+    def load(self, config):
+        """Return the (detector, ocr, upscaler, processing) modules for a config."""
+        return self.detector(config), self.ocr(config), self.upscaler(config), self.processing(config)
+
+    def warmup(self, config, recognizers=None):
+        """
+        Load all modules of a config ahead of the first request.
+        recognizers: additional recognizer types to load besides the configured one.
+        """
+        self.load(config)
+        for recognizer in recognizers or []:
+            recognizer_config = copy.deepcopy(config)
+            recognizer_config["recognizer"]["type"] = recognizer
+            try:
+                self.ocr(recognizer_config)
+            except Exception as e:
+                print(f"Warmup of recognizer '{recognizer}' failed: {e}")
+
+    def stats(self):
+        return [dict(stats) for stats in self._stats.values()]
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._stats.clear()
+            self._locks.clear()
+
+    @staticmethod
+    def _config_key(config):
+        return json.dumps(config, sort_keys=True)
+
+    @staticmethod
+    def _parameter_bytes(model):
+        # LPD_Module wraps YOLO (model.model), Parseq is the module itself (model)
+        try:
+            import torch
+        except ImportError:
+            return 0
+        total = 0
+        for attr in ("model", "model.model"):
+            candidate = model
+            for name in attr.split("."):
+                candidate = getattr(candidate, name, None)
+            if isinstance(candidate, torch.nn.Module):
+                total = max(total, sum(p.numel() * p.element_size() for p in candidate.parameters()))
+        return total
+
+
+# Shared instance used by predict.py and app.py
+registry = ModelRegistry()
@@ -0,0 +1,173 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from modules.detection import detector_path
+from utils.utils import file_hash
+
+
+class ResultCache:
+    """
+    Results of predict() for single images, keyed by the image content and every setting
+    that changes the results: detector checkpoint and format, recognizer, upscaler and
+    image processing. Re-uploads and the fixed example images are answered without inference.
+
+    memory: LRU of the last memory_items results
+    disk:   optional second tier of JSON files in directory, the least recently used
+            files are removed once they take more than max_disk_mb. Only used if the
+            crop store keeps its crops across restarts, not with crop_store.type memory.
+
+    A cached result is only returned while the crop store still has all of its crops.
+    """
+    def __init__(self, config):
+        self.enabled = config["enabled"]
+        self.memory_items = config["memory_items"]
+        self.directory = config["directory"]
+        self.max_disk_bytes = int(config["max_disk_mb"] * 2**20)
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.checkpoint_hashes = {}  # (path, mtime, size): sha256, checkpoints are only hashed once
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.stale = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, image_path, config):
+        checkpoint = detector_path(config)
+        settings = {
+            "checkpoint": self.checkpoint_hash(checkpoint),
+            "recognizer": config["recognizer"],
+            "upscaler": config["upscaler"],
+            "image_processing": config["image_processing"],
+            "crop_store": config["crop_store"]["type"],
+        }
+        digest = hashlib.sha256(file_hash(image_path).encode())
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def checkpoint_hash(self, path):
+        stat = os.stat(path)
+        entry = (path, stat.st_mtime, stat.st_size)
+        checksum = self.checkpoint_hashes.get(entry)
+        if checksum is None:
+            checksum = file_hash(path)
+            self.checkpoint_hashes[entry] = checksum
+        return checksum
+
+    def get(self, key, crop_store):
+        """Cached results, or None if there are none or their crops were removed."""
+        with self.lock:
+            results = self.memory.get(key)
+            if results is not None:
+                self.memory.move_to_end(key)
+                tier = "memory"
+        if results is None and crop_store.persistent:
+            results = self.read_disk(key)
+            tier = "disk"
+
+        if results is not None and not all(crop_store.exists(result.get("image")) for result in results):
+            self.remove(key)
+            results = None
+            with self.lock:
+                self.stale += 1
+
+        with self.lock:
+            if results is None:
+                self.misses += 1
+                return None
+            self.hits[tier] += 1
+            if tier == "disk":
+                self.remember(key, results)
+        return copy.deepcopy(results)
+
+    def put(self, key, results, crop_store):
+        results = copy.deepcopy(results)
+        with self.lock:
+            self.remember(key, results)
+        if self.directory and crop_store.persistent:
+            self.write_disk(key, results)
+
+    def remember(self, key, results):
+        # Called with the lock held
+        self.memory[key] = results
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def remove(self, key):
+        with self.lock:
+            self.memory.pop(key, None)
+        if self.directory:
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self.path(key)
+        try:
+            with open(path, 'r') as file:
+                results = json.load(file)
+            # The modification time orders the files for eviction
+            os.utime(path)
+            return results
+        except (OSError, ValueError):
+            return None
+
+    def write_disk(self, key, results):
+        # Write to a temporary file first, so an interrupted write never leaves a broken entry
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump(results, file)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            print(f"Writing cached results {path} failed: {e}")
+            return
+        self.evict_disk()
+
+    def evict_disk(self):
+        with self.lock:
+            files = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in files)
+            for _, size, name in sorted(files):
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+                total -= size
+
+    def stats(self):
+        with self.lock:
+            hits = sum(self.hits.values())
+            requests = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.hits["memory"],
+                "disk_hits": self.hits["disk"],
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": round(hits / requests, 4) if requests else None,
+                "memory_items": len(self.memory),
+            }
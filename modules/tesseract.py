@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+class TesseractPool:
+    """
+    Runs tesseract on batches of plate crops with a pool of worker threads.
+
+    With tesserocr, every thread keeps its own initialized tesseract API, so no process
+    is started and no model is loaded per plate. Without it, pytesseract starts one
+    tesseract process per plate, but the pool still runs them in parallel.
+    Both report the confidence of every recognized word.
+    """
+    def __init__(self, config):
+        self.oem = config["tesseract_engine"]
+        self.psm = config["tesseract_segmentation"]
+        self.tesseract_config = f'--oem {self.oem} --psm {self.psm}'
+        backend = config.get("tesseract_backend", "auto")
+        if backend == "auto":
+            backend = "tesserocr" if tesserocr is not None else "pytesseract"
+        if backend == "tesserocr" and tesserocr is None:
+            raise ValueError("tesseract_backend tesserocr needs the tesserocr package.")
+        if backend not in ("tesserocr", "pytesseract"):
+            raise ValueError(f"Unsupported tesseract backend: {backend}")
+        self.backend = backend
+
+        self.executor = ThreadPoolExecutor(max_workers=config.get("tesseract_workers", 4))
+        self.local = threading.local()
+        self.apis = []
+        self.lock = threading.Lock()
+
+    def recognize(self, images):
+        """One (text, confidence, char_confidences) tuple per image, confidences in 0-1."""
+        read = self.read_tesserocr if self.backend == "tesserocr" else self.read_pytesseract
+        return list(self.executor.map(self.safe(read), images))
+
+    def safe(self, read):
+        def run(image):
+            try:
+                return self.result(read(image))
+            except Exception as e:
+                print(f"Tesseract OCR failed: {e}")  # Debugging-Ausgabe
+                return "OCR failed: No text detected or invalid input.", 0.0, []
+        return run
+
+    def read_tesserocr(self, image):
+        api = getattr(self.local, "api", None)
+        if api is None:
+            # One API per thread, tesserocr releases the GIL while recognizing
+            api = tesserocr.PyTessBaseAPI(psm=self.psm, oem=self.oem)
+            self.local.api = api
+            with self.lock:
+                self.apis.append(api)
+        api.SetImage(Image.fromarray(image))
+        return [(word, confidence) for word, confidence in api.MapWordConfidences() if word.strip()]
+
+    def read_pytesseract(self, image):
+        data = pytesseract.image_to_data(image, config=self.tesseract_config, output_type=pytesseract.Output.DICT)
+        # Rows of blocks, paragraphs and lines have a confidence of -1
+        return [(word, float(confidence)) for word, confidence in zip(data["text"], data["conf"])
+                if word.strip() and float(confidence) >= 0]
+
+    @staticmethod
+    def result(words):
+        if not words:
+            raise ValueError("No text detected.")
+        text = " ".join(word.strip() for word, _ in words)
+        confidences = [confidence / 100 for _, confidence in words]
+        confidence = sum(confidences) / len(confidences)
+        # Every character gets the confidence of its word, spaces the mean
+        char_confidences = []
+        for i, ((word, _), word_confidence) in enumerate(zip(words, confidences)):
+            if i > 0:
+                char_confidences.append(confidence)
+            char_confidences.extend([word_confidence] * len(word.strip()))
+        return text, confidence, char_confidences
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for api in self.apis:
+                api.End()
+            self.apis.clear()
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+STAGES = ["decode", "gate", "detect", "track", "crop", "upscale", "preprocess", "ocr", "write"]
+
+
+class StageTimer:
+    """
+    Wall time per pipeline stage, recorded per image or frame (per plate for the
+    crop, upscale, preprocess and write stages).
+
+    Every stage keeps the most recent max_samples durations for the p50/p95/p99
+    histogram plus running totals. Processed images and frames are counted as well,
+    so the summary also reports the throughput since the last reset.
+    """
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+            self.totals = defaultdict(float)
+            self.counts = defaultdict(int)
+            self.items = defaultdict(int)
+            self.started = time.time()
+
+    def record(self, stage, seconds, items=1):
+        """Record the duration of a stage. Batches spread their time over their items."""
+        if items <= 0:
+            return
+        with self.lock:
+            self.samples[stage].extend([seconds / items] * items)
+            self.totals[stage] += seconds
+            self.counts[stage] += items
+
+    @contextmanager
+    def time(self, stage, items=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, items)
+
+    def count(self, unit, items=1):
+        """Count processed units (e.g. "images", "frames") for the throughput."""
+        with self.lock:
+            self.items[unit] += items
+
+    def merge(self, timings):
+        """Record {stage: seconds} measured elsewhere, e.g. in a worker process."""
+        for stage, seconds in timings.items():
+            self.record(stage, seconds)
+
+    def summary(self):
+        with self.lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            stages = {}
+            # Known stages in pipeline order, then anything else that was recorded
+            for stage in STAGES + sorted(set(self.samples) - set(STAGES)):
+                samples = self.samples.get(stage)
+                if not samples:
+                    continue
+                p50, p95, p99 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 95, 99]) * 1000
+                stages[stage] = {
+                    "count": self.counts[stage],
+                    "total_s": round(self.totals[stage], 3),
+                    "mean_ms": round(1000 * self.totals[stage] / self.counts[stage], 2),
+                    "p50_ms": round(p50, 2),
+                    "p95_ms": round(p95, 2),
+                    "p99_ms": round(p99, 2),
+                }
+            throughput = {unit: round(count / elapsed, 3) for unit, count in self.items.items()}
+            return {
+                "elapsed_s": round(elapsed, 3),
+                "stages": stages,
+                "processed": dict(self.items),
+                "throughput_per_s": throughput,
+            }
+
+    def print_summary(self):
+        summary = self.summary()
+        print("=== Stage Latency (ms) ===")
+        print(f"{'stage':<12}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'total_s':>10}")
+        for stage, stats in summary["stages"].items():
+            print(f"{stage:<12}{stats['count']:>8}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}"
+                  f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['total_s']:>10.2f}")
+        for unit, rate in summary["throughput_per_s"].items():
+            print(f"Throughput: {rate:.2f} {unit}/s ({summary['processed'][unit]} in {summary['elapsed_s']:.1f}s)")
+
+
+# Shared instance used by predict.py, app.py and eval.py
+timings = StageTimer()
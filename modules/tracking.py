@@ -0,0 +1,147 @@
+import numpy as np
+
+from utils.utils import match_boxes
+
+
+class DeepSortTracker:
+    """DeepSORT with its appearance embedder, runs a CNN on every detection crop."""
+    def __init__(self, config):
+        from deep_sort_realtime.deepsort_tracker import DeepSort
+
+        self.max_age = config["max_age"]
+        self.tracker = DeepSort(
+            max_age=self.max_age,      # How long an object is tracked without detections
+            n_init=config["n_init"],   # Minimum number of confirmed detections before being tracked
+        )
+
+    def update(self, boxes, frame):
+        """
+        boxes: detections [x1, y1, x2, y2] of the frame.
+        Returns (track_id, [x1, y1, x2, y2]) for every confirmed track seen in this frame.
+        """
+        detections = [([x1, y1, x2 - x1, y2 - y1], 1.0, "license_plate") for x1, y1, x2, y2 in boxes]
+        tracks = self.tracker.update_tracks(detections, frame=frame)
+
+        results = []
+        for track in tracks:
+            # Tracks without a detection in this frame only have their Kalman prediction
+            if not track.is_confirmed() or track.time_since_update > 0:
+                continue
+            # orig: the detection box of this frame instead of the Kalman prediction
+            results.append((track.track_id, list(track.to_tlbr(orig=True))))
+        return results
+
+
+class SortTracker:
+    """
+    SORT: constant velocity Kalman filter per track and IoU association, no appearance model.
+    The filters of all tracks are predicted and updated together as arrays.
+    State per track: center x, center y, area, aspect ratio and the velocities of the first three.
+    """
+    def __init__(self, config):
+        self.max_age = config["max_age"]
+        self.n_init = config["n_init"]
+        self.iou_threshold = config["iou_threshold"]
+
+        self.F = np.eye(7)
+        self.F[0, 4] = self.F[1, 5] = self.F[2, 6] = 1
+        self.H = np.eye(4, 7)
+        self.R = np.diag([1.0, 1.0, 10.0, 10.0])
+        self.Q = np.eye(7)
+        self.Q[4:, 4:] *= 0.01
+        self.Q[6, 6] *= 0.01
+        self.P0 = np.eye(7) * 10
+        self.P0[4:, 4:] *= 1000  # Velocities are unknown at first
+
+        self.states = np.zeros((0, 7))
+        self.covariances = np.zeros((0, 7, 7))
+        self.ids = np.zeros(0, dtype=int)
+        self.hit_streaks = np.zeros(0, dtype=int)
+        self.misses = np.zeros(0, dtype=int)
+        self.next_id = 1
+        self.frame_count = 0
+
+    def update(self, boxes, frame=None):
+        """Same as DeepSortTracker.update, the frame is not used."""
+        self.frame_count += 1
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+        # Predict all tracks, areas must not become negative
+        shrinking = self.states[:, 2] + self.states[:, 6] <= 0
+        self.states[shrinking, 6] = 0
+        self.states = self.states @ self.F.T
+        self.covariances = self.F @ self.covariances @ self.F.T + self.Q
+        self.misses += 1
+
+        matches = match_boxes(self.to_boxes(self.states), boxes, self.iou_threshold)
+        tracks = np.array([t for t, _, _ in matches], dtype=int)
+        detections = np.array([d for _, d, _ in matches], dtype=int)
+
+        if len(matches):
+            self.correct(tracks, self.to_measurements(boxes[detections]))
+            self.misses[tracks] = 0
+            self.hit_streaks[tracks] += 1
+        unmatched_tracks = np.setdiff1d(np.arange(len(self.states)), tracks)
+        self.hit_streaks[unmatched_tracks] = 0
+
+        results = []
+        confirmed = self.hit_streaks[tracks] >= self.n_init if len(matches) else []
+        for track, detection, is_confirmed in zip(tracks, detections, confirmed):
+            # Tracks are reported right away in the first frames, as in SORT
+            if is_confirmed or self.frame_count <= self.n_init:
+                results.append((int(self.ids[track]), boxes[detection].tolist()))
+
+        self.start_tracks(np.delete(boxes, detections, axis=0))
+        self.remove_lost()
+        return results
+
+    def correct(self, tracks, measurements):
+        states = self.states[tracks]
+        covariances = self.covariances[tracks]
+        residuals = measurements - states @ self.H.T
+        S = self.H @ covariances @ self.H.T + self.R
+        K = covariances @ self.H.T @ np.linalg.inv(S)
+        self.states[tracks] = states + (K @ residuals[..., None])[..., 0]
+        self.covariances[tracks] = (np.eye(7) - K @ self.H) @ covariances
+
+    def start_tracks(self, boxes):
+        count = len(boxes)
+        if count == 0:
+            return
+        states = np.zeros((count, 7))
+        states[:, :4] = self.to_measurements(boxes)
+        self.states = np.concatenate([self.states, states])
+        self.covariances = np.concatenate([self.covariances, np.repeat(self.P0[None], count, axis=0)])
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + count)])
+        self.hit_streaks = np.concatenate([self.hit_streaks, np.ones(count, dtype=int)])
+        self.misses = np.concatenate([self.misses, np.zeros(count, dtype=int)])
+        self.next_id += count
+
+    def remove_lost(self):
+        keep = self.misses <= self.max_age
+        self.states = self.states[keep]
+        self.covariances = self.covariances[keep]
+        self.ids = self.ids[keep]
+        self.hit_streaks = self.hit_streaks[keep]
+        self.misses = self.misses[keep]
+
+    @staticmethod
+    def to_measurements(boxes):
+        # [x1, y1, x2, y2] to [center x, center y, area, aspect ratio]
+        w = boxes[:, 2] - boxes[:, 0]
+        h = boxes[:, 3] - boxes[:, 1]
+        return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w * h, w / np.maximum(h, 1e-6)], axis=1)
+
+    @staticmethod
+    def to_boxes(states):
+        w = np.sqrt(np.clip(states[:, 2] * states[:, 3], 0, None))
+        h = states[:, 2] / np.maximum(w, 1e-6)
+        return np.stack([states[:, 0] - w / 2, states[:, 1] - h / 2, states[:, 0] + w / 2, states[:, 1] + h / 2], axis=1)
+
+
+def create_tracker(config):
+    if config["type"] == "deepsort":
+        return DeepSortTracker(config)
+    if config["type"] == "sort":
+        return SortTracker(config)
+    raise ValueError(f"Unsupported tracker: {config['type']}")
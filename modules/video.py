@@ -0,0 +1,206 @@
+import threading
+import time
+
+import cv2
+
+
+class FrameReader:
+    """
+    Returns the sampled frames of a cv2.VideoCapture as (frame_index, frame).
+
+    Sampling modes:
+        read:   decode every frame and drop the skipped ones
+        grab:   only grab() skipped frames, so they are never converted to BGR
+        seek:   jump to the next sampled frame with CAP_PROP_POS_FRAMES (for large gaps)
+
+    Frames are either sampled every frame_interval frames or, if sample_fps is set,
+    sample_fps times per second of video.
+    """
+    def __init__(self, cap, frame_interval=1, sample_fps=None, mode="grab"):
+        self.cap = cap
+        self.mode = mode
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.frame_interval = max(1, int(frame_interval))
+        self.sample_fps = sample_fps if sample_fps and self.fps > 0 else None
+
+        if self.mode == "read":
+            self.skip = self.skip_read
+        elif self.mode == "grab":
+            self.skip = self.skip_grab
+        elif self.mode == "seek":
+            self.skip = self.skip_seek
+        else:
+            raise ValueError(f"Unsupported sampling mode: {self.mode}")
+
+        # Gaps shorter than ~2 seconds are grabbed instead of seeked
+        self.seek_threshold = int(2 * self.fps) if self.fps > 0 else 30
+
+        self.position = 0  # Index of the next frame the capture returns
+        self.samples = 0
+        self.next_index = 0
+
+    @property
+    def step(self):
+        """Average number of frames between two samples"""
+        if self.sample_fps:
+            return max(self.fps / self.sample_fps, 1)
+        return self.frame_interval
+
+    def __call__(self):
+        return self.read()
+
+    def read(self):
+        if not self.skip(self.next_index - self.position):
+            return None
+
+        ret, frame = self.cap.read()
+        if not ret:
+            return None  # Stop when the video ends
+
+        index = self.next_index
+        self.position = index + 1
+        self.samples += 1
+        self.next_index = self.sample_index(self.samples)
+        return index, frame
+
+    def sample_index(self, sample):
+        if self.sample_fps:
+            # Time based sampling, never sample the same frame twice
+            return max(round(sample * self.fps / self.sample_fps), self.position)
+        return sample * self.frame_interval
+
+    def skip_read(self, count):
+        for _ in range(count):
+            ret, _ = self.cap.read()
+            if not ret:
+                return False
+        return True
+
+    def skip_grab(self, count):
+        for _ in range(count):
+            if not self.cap.grab():
+                return False
+        return True
+
+    def skip_seek(self, count):
+        if count <= 0:
+            return True
+        # Short gaps are cheaper to grab than to seek to the previous keyframe
+        if count < self.seek_threshold:
+            return self.skip_grab(count)
+        return self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.position + count) or self.skip_grab(count)
+
+
+class LiveFrameReader:
+    """
+    Reads a live stream (RTSP/HTTP URL or camera index) in a background thread.
+
+    Only the newest frame is kept, so frames are dropped whenever inference falls
+    behind instead of building up latency. If no frame arrives for stall_timeout
+    seconds the stream is reopened. Frame indices count all received frames,
+    including the dropped ones.
+    """
+    def __init__(self, source, sample_fps=None, stall_timeout=5.0, reconnect_delay=2.0):
+        # Device indices are passed as strings from config/query parameters
+        self.source = int(source) if str(source).isdigit() else source
+        self.sample_fps = sample_fps
+        self.stall_timeout = stall_timeout
+        self.reconnect_delay = reconnect_delay
+
+        self.cap = None
+        self.fps = 0
+        self.frame = None
+        self.index = -1
+        self.captured = None
+        self.last_index = -1
+        self.last_read_time = 0.0
+        self.dropped = 0
+        self.capture_times = {}
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+
+        self.open()
+        self.fps = self.fps or 25  # Many cameras don't report their frame rate
+        self.grabber = threading.Thread(target=self.grab_loop, daemon=True)
+        self.grabber.start()
+
+    @property
+    def step(self):
+        """Average number of frames between two samples"""
+        if self.sample_fps:
+            return max(self.fps / self.sample_fps, 1)
+        return 1
+
+    def __call__(self):
+        return self.read()
+
+    def open(self):
+        if self.cap is not None:
+            self.cap.release()
+        timeout_ms = int(self.stall_timeout * 1000)
+        params = []
+        # Let FFmpeg give up on hanging streams instead of blocking forever
+        if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+            params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms]
+        self.cap = cv2.VideoCapture(self.source, cv2.CAP_ANY, params)
+        if not self.cap.isOpened():
+            print(f"Cannot open stream: {self.source}")
+            return False
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or self.fps
+        return True
+
+    def grab_loop(self):
+        last_frame_time = time.time()
+        while not self.stopped.is_set():
+            ret, frame = self.cap.read() if self.cap.isOpened() else (False, None)
+            now = time.time()
+            if not ret:
+                if now - last_frame_time > self.stall_timeout:
+                    print(f"Stream stalled, reconnecting to {self.source}")
+                    self.stopped.wait(self.reconnect_delay)
+                    self.open()
+                    last_frame_time = time.time()
+                else:
+                    self.stopped.wait(0.01)
+                continue
+
+            last_frame_time = now
+            with self.condition:
+                self.frame = frame
+                self.index += 1
+                self.captured = now
+                self.condition.notify_all()
+
+    def read(self):
+        # Limit the sample rate, newer frames replace the current one while waiting
+        if self.sample_fps:
+            delay = self.last_read_time + 1.0 / self.sample_fps - time.time()
+            if delay > 0:
+                self.stopped.wait(delay)
+
+        with self.condition:
+            while not self.stopped.is_set() and self.index == self.last_index:
+                self.condition.wait(timeout=0.5)
+            if self.stopped.is_set():
+                return None
+
+            self.dropped += self.index - self.last_index - 1
+            self.last_index = self.index
+            self.last_read_time = time.time()
+            self.capture_times[self.index] = self.captured
+            return self.index, self.frame
+
+    def pop_capture_time(self, frame_index):
+        with self.condition:
+            return self.capture_times.pop(frame_index, None)
+
+    def stop(self):
+        """Unblock read(), it returns None from now on"""
+        self.stopped.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def release(self):
+        self.stop()
+        self.grabber.join()
+        self.cap.release()
@@ -5,13 +5,18 @@ import matplotlib.pyplot as plt
 import yaml
 import torch
 import re
-
-from deep_sort_realtime.deepsort_tracker import DeepSort
-from modules.detection import LPD_Module
-from modules.ocr import OCR_Module
-from modules.upscaling import Upscaler
-from modules.image_processing import Processing
-from utils.utils import crop_image, show_image, normalize_text, calculate_iou
+import uuid
+import itertools
+import time
+
+from modules.registry import registry
+from modules.pipeline import VideoPipeline
+from modules.video import FrameReader, LiveFrameReader
+from modules.aggregation import TrackAggregator
+from modules.tracking import create_tracker
+from modules.motion import MotionGate
+from modules.timing import timings
+from utils.utils import crop_image, show_image, normalize_text, match_boxes, warp_plates
 
 def load_images(path):
     image_list = []
@@ -19,7 +24,8 @@ def load_images(path):
     # If path is a single file
     if os.path.isfile(path):
         if path.endswith(('.jpg', '.png', '.jpeg')):  # Add support for PNG and other formats
-            img = cv2.imread(path)
+            with timings.time("decode"):
+                img = cv2.imread(path)
             if img is not None:
                 image_list.append(img)
         else:
@@ -30,7 +36,8 @@ def load_images(path):
         for filename in os.listdir(path):
             if filename.endswith(('.jpg', '.png', '.jpeg')):
                 image_path = os.path.join(path, filename)
-                img = cv2.imread(image_path)
+                with timings.time("decode"):
+                    img = cv2.imread(image_path)
                 if img is not None:
                     image_list.append(img)
     
@@ -68,10 +75,7 @@ def load_images_and_labels(directory_path, label_path):
 def test(config):
 
     images_and_labels = load_images_and_labels(config["data_path"], config["label_path"])
-    detector = LPD_Module(config["lpd_checkpoint_path"], config["verbose"])
-    ocr = OCR_Module(config["recognizer"])
-    upscaler = Upscaler(config["upscaler"])
-    image_processing = Processing(config["image_processing"])
+    detector, ocr, upscaler, image_processing = registry.load(config)
     visualize = config["visualize"]
 
     if(visualize):
@@ -109,79 +113,101 @@ def test(config):
         #plt.show()
 
 
+def read_plates(ocr, image_processing, lp_images, fused=False, char_confidences=False, rectified=False):
+    """
+    Text recognition for all plates of an image or frame in one batch.
+    fused: lp_images are raw crops that are resized and processed as one tensor batch.
+    rectified: lp_images were warped from OBB corners.
+    """
+    if not lp_images:
+        return []
+    if not fused:
+        with timings.time("ocr"):
+            return ocr.recognize_batch(lp_images, char_confidences=char_confidences)
+
+    with timings.time("preprocess", len(lp_images)):
+        batch = image_processing.process_batch(lp_images, ocr.input_size, rectified)
+    with timings.time("ocr"):
+        return ocr.recognize_tensor(batch, char_confidences=char_confidences)
+
+
 def predict(config):
     images = load_images(config["data_path"])
-    detector = LPD_Module(config["lpd_checkpoint_path"], config["verbose"])
-    ocr = OCR_Module(config["recognizer"])
-    upscaler = Upscaler(config["upscaler"])
-    image_processing = Processing(config["image_processing"])
+    detector, ocr, upscaler, image_processing = registry.load(config)
     visualize = config["visualize"]
     
+    batch_size = config.get("detection_batch_size", 1)
+    crop_store = registry.crop_store(config)
+    run_id = uuid.uuid4().hex[:8]  # Keeps crop names of concurrent requests apart
+
+    # Upscaling and processing are done on the whole batch right before OCR
+    fused = image_processing.fused and ocr.input_size is not None
+    
     results = []  # List to store results
 
-    for i, image in enumerate(images):
+    # Detect on batches of images, one list of boxes per image
+    boxes_per_image = []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
         try:
-            boxes = detector(image)
-            if not boxes:  # No license plates detected
-                results.append({
-                    "image": None,
-                    "error": "No license plates detected."
-                })
-                continue
+            with timings.time("detect", len(batch)):
+                boxes_per_image.extend(detector.detect_batch(batch, batch_size))
         except Exception as e:
+            boxes_per_image.extend([e] * len(batch))
+
+    for i, (image, boxes) in enumerate(zip(images, boxes_per_image)):
+        timings.count("images")
+        if isinstance(boxes, Exception):
             results.append({
                 "image": None,
-                "error": f"License plate detection failed: {str(e)}"
+                "error": f"License plate detection failed: {str(boxes)}"
             })
             continue
+        if not boxes:  # No license plates detected
+            results.append({
+                "image": None,
+                "error": "No license plates detected."
+            })
+            continue
+
+        # OBB plates are rectified from their corners straight to the recognizer input size
+        warped = None
+        if detector.obb:
+            try:
+                with timings.time("crop", len(boxes)):
+                    warped = warp_plates(image, detector.corners(boxes), ocr.input_size)
+            except Exception as e:
+                print(f"Rectifying the plates of image {i} failed: {e}")
 
+        plates = []
         for j, box in enumerate(boxes):
+            cropped_image_path = None
             try:
-                # Crop the image to simplify ocr
-                xyxy = map(int, box.xyxy[0])
-                lp_image = crop_image(image, xyxy)
+                if warped is not None:
+                    lp_image = warped[j]
+                else:
+                    # Crop the image to simplify ocr
+                    xyxy = map(int, box.xyxy[0])
+                    with timings.time("crop"):
+                        lp_image = crop_image(image, xyxy)
 
 
-                # Upscaling
-                lp_image = upscaler(lp_image)
+                if not fused:
+                    # Upscaling, plates rectified to the recognizer input size already have their final size
+                    if warped is None or ocr.input_size is None:
+                        with timings.time("upscale"):
+                            lp_image = upscaler(lp_image)
 
-                # Processing
-                lp_image = image_processing(lp_image)
+                    # Processing
+                    with timings.time("preprocess"):
+                        lp_image = image_processing(lp_image, rectified=warped is not None)
 
 
                 # Save the cropped image
-                cropped_image_path = f'static/uploads/cropped_plate_{i}_{j}.png'
-                cv2.imwrite(cropped_image_path, lp_image)
-
+                with timings.time("write"):
+                    cropped_image_path = crop_store.save(f'{run_id}_plate_{i}_{j}', lp_image)
 
-                # Text recognition
-                lp_text, confidence = ocr(lp_image)
-
-                # Filter text, replace some symbols with spaces
-                lp_text_normalized = normalize_text(lp_text)
-                text_filtered = re.sub(r'[^A-Z0-9]', '', lp_text_normalized)
-                text_filtered = re.sub(r'([A-Z0-9])\1{4}', lambda m: m.group(1) * 4, text_filtered)
-
-                box_serializable = box.xyxy.cpu().numpy().tolist() if hasattr(box, 'xyxy') else str(box)
-
-                # If OCR failed, add only the error and skip the filtering
-                if "OCR failed" in lp_text:
-                    results.append({
-                        "image": cropped_image_path,
-                        "box": box_serializable,
-                        "lp_text": lp_text,
-                        "error": "OCR processing failed: No valid text detected."
-                    })
-                else:
-                    # Filter text and append a valid result
-                    text_filtered = re.sub(r'(?<!\s)[^A-Z0-9-\s](?!\s)', ' ', lp_text)
-
-                    results.append({
-                        "image": cropped_image_path,
-                        "box": box_serializable,
-                        "lp_text": lp_text,
-                        "text_filtered": text_filtered
-                    })
+                plates.append((box, lp_image, cropped_image_path))
             except Exception as e:
                 box_serializable = box.xyxy.cpu().numpy().tolist() if hasattr(box, 'xyxy') else str(box)
 
@@ -193,10 +219,87 @@ def predict(config):
                     })
                 continue
 
+        # Text recognition for all plates of the image in one batch
+        ocr_results = read_plates(ocr, image_processing, [lp_image for _, lp_image, _ in plates], fused, rectified=warped is not None)
+
+        for (box, lp_image, cropped_image_path), (lp_text, confidence) in zip(plates, ocr_results):
+            box_serializable = box.xyxy.cpu().numpy().tolist() if hasattr(box, 'xyxy') else str(box)
+
+            # If OCR failed, add only the error and skip the filtering
+            if "OCR failed" in lp_text:
+                results.append({
+                    "image": cropped_image_path,
+                    "box": box_serializable,
+                    "lp_text": lp_text,
+                    "error": "OCR processing failed: No valid text detected."
+                })
+            else:
+                # Filter text and append a valid result
+                text_filtered = re.sub(r'(?<!\s)[^A-Z0-9-\s](?!\s)', ' ', lp_text)
+
+                results.append({
+                    "image": cropped_image_path,
+                    "box": box_serializable,
+                    "lp_text": lp_text,
+                    "text_filtered": text_filtered
+                })
+
+    return results
+
+
+# Errors that belong to the result of an image. Others come from exceptions (e.g. CUDA out of memory)
+# and may not happen on the next attempt, such results are not cached.
+CACHEABLE_ERRORS = {"No license plates detected.", "OCR processing failed: No valid text detected."}
+
+def predict_cached(config):
+    """
+    predict() for a single image, answered from the result cache if the same image
+    was already processed with the same models and settings.
+    """
+    cache = registry.result_cache(config)
+    if not cache.enabled or not os.path.isfile(config["data_path"]):
+        return predict(config)
+
+    crop_store = registry.crop_store(config)
+    key = cache.key(config["data_path"], config)
+    results = cache.get(key, crop_store)
+    if results is not None:
+        timings.count("cached_images")
+        return results
+
+    results = predict(config)
+    if all(result.get("error") is None or result["error"] in CACHEABLE_ERRORS for result in results):
+        cache.put(key, results, crop_store)
     return results
 
 
-def predict_from_video(config, progress_callback=None):
+def format_timestamp(frame_count, fps):
+    # Calculate timestamp (HH:MM:SS)
+    seconds = frame_count / fps
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    seconds = int(seconds % 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def predict_from_video(config, progress_callback=None, result_callback=None):
+    results = []
+    for result in iter_predict_from_video(config, progress_callback=progress_callback):
+        results.append(result)
+        if result_callback:
+            result_callback([result])
+
+    if (len(results) == 0):
+        print("No license plates detected in the video.")
+    else:
+        return results
+
+
+def iter_predict_from_video(config, progress_callback=None):
+    """
+    Generator version of predict_from_video, yields every result as soon as it is available.
+    Nothing is kept after it was yielded, so memory stays flat on long videos.
+    """
     video_path = config["data_path"]
     cap = cv2.VideoCapture(video_path)
     
@@ -204,160 +307,269 @@ def predict_from_video(config, progress_callback=None):
         raise ValueError(f"Cannot open video file: {video_path}")
 
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    detector = LPD_Module(config["lpd_checkpoint_path"], verbose=config["verbose"])
-    ocr = OCR_Module(config["recognizer"])
-    upscaler = Upscaler(config["upscaler"])
-    image_processing = Processing(config["image_processing"])
-    frame_interval = config["frame_interval"]
-
-    # Create output folder if it doesn't exist
-    cropped_dir = "static/uploads/"
-    os.makedirs(cropped_dir, exist_ok=True)
-
-    fps = cap.get(cv2.CAP_PROP_FPS)  # Get video FPS
-
-    # Initialize DeepSORT tracker
-    tracker = DeepSort(
-        max_age=20,           # How long an object is tracked without detections
-        # n_init=2,           # Minimum number of confirmed detections before being tracked
-        # max_cosine_distance=0.3,  # Cosine distance threshold for feature matching
+    video_config = config.get("video", {})
+
+    # Decode stage: returns the next sampled frame
+    read_frame = FrameReader(
+        cap,
+        frame_interval=config["frame_interval"],
+        sample_fps=video_config.get("sample_fps"),
+        mode=video_config.get("sampling", "grab"),
     )
-    
 
-    frame_count = 0
-    max_track_id = -1
-    results = []
-    while cap.isOpened():
-        # print(f"___Frame {frame_count}___")
-        ret, frame = cap.read()
-        if not ret:
-            break  # Stop when the video ends
-
-        # Calculate timestamp (HH:MM:SS)
-        seconds = frame_count / fps
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        seconds = int(seconds % 60)
-        time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        print(f"Time: {time_str}")
-
-        if frame_count % frame_interval == 0:
-            if progress_callback:
-                # Using processed frames over total frames (approximate)
-                progress = int((frame_count / total_frames) * 100)
-                progress_callback(progress)
-
-            # frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            # frame_tensor = torch.from_numpy(frame_rgb).permute(2, 0, 1).float() / 255.0  # Shape: [3, H, W], normalized
-            # frame_tensor = frame_tensor.unsqueeze(0).to(detector.model.device)  # Add batch dim and move to device
-
-            # print(f"Frame data type: {type(frame)}")
-            boxes = detector(frame)
-            center_boxes = []  # Prepare for DeepSORT
-            bounding_boxes = []
-
-
-            for j, box in enumerate(boxes):
-                try:
-                    x1, y1, x2, y2 = box.xyxy.cpu().numpy().tolist()[0]
-
-                    # For Debugging
-                    results.append({
-                        "frame": frame_count,
+    def on_frame(frame_index, frame_results):
+        if progress_callback:
+            # Using processed frames over total frames (approximate)
+            progress = int((frame_index / total_frames) * 100)
+            progress_callback(progress)
+
+    try:
+        yield from iter_predict_frames(config, read_frame, video_config, on_frame)
+    finally:
+        cap.release()
+
+
+def iter_predict_from_stream(config):
+    """
+    Continuous inference on a live stream (camera URL or device index in config["data_path"]).
+    Frames are dropped while inference is busy, every result carries its end-to-end latency.
+    Runs until the generator is closed.
+    """
+    stream_config = config["stream"]
+    read_frame = LiveFrameReader(
+        config["data_path"],
+        sample_fps=stream_config.get("sample_fps"),
+        stall_timeout=stream_config["stall_timeout"],
+        reconnect_delay=stream_config["reconnect_delay"],
+    )
+
+    def on_frame(frame_index, frame_results):
+        captured = read_frame.pop_capture_time(frame_index)
+        latency_ms = round((time.time() - captured) * 1000, 1) if captured else None
+        for result in frame_results:
+            result["latency_ms"] = latency_ms
+
+    # Frames are decoded by the grabber thread, reading only waits for the next one
+    results = iter_predict_frames(config, read_frame, stream_config, on_frame, time_decode=False)
+    try:
+        for result in results:
+            yield result
+    finally:
+        # Stop reading first, otherwise the decode stage waits for the next frame of the stream
+        read_frame.stop()
+        results.close()
+        read_frame.release()
+
+
+def iter_predict_frames(config, read_frame, pipeline_config, on_frame=None, time_decode=True):
+    """
+    Shared video/stream pipeline: detection, tracking and OCR on the frames of read_frame.
+    on_frame(frame_index, results) is called before the results of a frame are yielded.
+    time_decode: record the time of read_frame as the decode stage.
+    """
+    detector, ocr, upscaler, image_processing = registry.load(config)
+    batch_size = config.get("detection_batch_size", 1)
+    raw_boxes = pipeline_config.get("raw_boxes", True)
+
+    crop_store = registry.crop_store(config)
+    run_id = uuid.uuid4().hex[:8]  # Keeps crop names of concurrent requests apart
+    fused = image_processing.fused and ocr.input_size is not None
+
+    fps = read_frame.fps
+
+    # Min. IoU between a track and the detector box it is assigned to
+    match_iou = pipeline_config.get("match_iou", 0.1)
+
+    # DeepSORT or the motion-only SORT tracker
+    tracker = create_tracker(config["tracker"])
+    max_age = tracker.max_age
+
+    # Caches the readings of every track and votes on the final plate text
+    aggregator = TrackAggregator(config["track_aggregation"])
+
+    # Decode stage: timed unless the frames are decoded elsewhere
+    def decode():
+        if not time_decode:
+            return read_frame()
+        with timings.time("decode"):
+            return read_frame()
+
+    # Position of the frame among the processed frames, track() sees every frame in order
+    track_positions = itertools.count()
+
+    # Skips detection on frames without motion in the ROI, crops the others to it
+    gate = MotionGate(config["motion_gate"])
+
+    # Detection stage: one batch of frames
+    def detect(frames):
+        if not gate.enabled:
+            with timings.time("detect", len(frames)):
+                return detector.detect_batch(frames, batch_size)
+
+        with timings.time("gate", len(frames)):
+            regions = [gate(frame) for frame in frames]
+        active = [i for i, region in enumerate(regions) if region is not None]
+        timings.count("gated_frames", len(frames) - len(active))
+
+        boxes_per_frame = [[] for _ in frames]
+        if active:
+            with timings.time("detect", len(active)):
+                detected = detector.detect_regions([frames[i] for i in active], [regions[i] for i in active], batch_size)
+            for i, boxes in zip(active, detected):
+                boxes_per_frame[i] = boxes
+        return boxes_per_frame
+
+    # Tracking stage: runs in frame order, decides which plates of the frame to read
+    def track(frame_index, frame, boxes):
+        position = next(track_positions)
+        raw_results = []
+        bounding_boxes = []
+        plate_corners = []  # OBB corners per bounding box
+
+        for j, box in enumerate(boxes):
+            try:
+                x1, y1, x2, y2 = box.xyxy.cpu().numpy().tolist()[0]
+
+                # For Debugging
+                if raw_boxes:
+                    raw_results.append({
+                        "frame": frame_index,
                         "fps": fps,
                         "box_raw": [x1, y1, x2, y2]
                     })
 
-                    w = x2 - x1
-                    h = y2 - y1
-                    cx = (x1 + x2) / 2
-                    cy = (y1 + y2) / 2
-                    conf = 1.0  # Assume high confidence since we trust the detector
-                    
-                    center_boxes.append(([cx, cy, w, h], conf, "license_plate"))  # Format for DeepSORT
-                    bounding_boxes.append([x1, y1, x2, y2])
-
-                except Exception as e:
-                    print(f"Error processing plate in frame {frame_count}: {e}")
-                    continue
-
-            # Update tracker with center_boxes
-            # tracked_objects = last_frame_tracked_objects
-            # last_frame_tracked_objects = tracker.update_tracks(center_boxes, frame=frame)
-            tracked_objects = tracker.update_tracks(center_boxes, frame=frame)
-            
-            # tracked_boxes = []
-            for track in tracked_objects:
-                if not track.is_confirmed():
-                    print("Not confirmed")
-                    continue
-                
-                track_id = track.track_id  # Unique object ID from DeepSORT
-                if int(track_id) > max_track_id:
-                    max_track_id = int(track_id)
-
-                tracker_box = track.to_tlbr(orig=True)
-
-                # Check if the tracker box overlaps with any of the bounding boxes
-                detector_box = None
-                iou_max = 0
-                for box in bounding_boxes:
-                    iou = calculate_iou(box, tracker_box)
-                    if iou > iou_max:
-                        iou_max = iou
-                        detector_box = box
-                        # tracked_boxes.append(box)
-
-                if detector_box is None:
-                    continue
-                                    
-                # Use YOLO bounding box (not DeepSORT's predicted one)
-                x1, y1, x2, y2 = list(map(int, detector_box))
-                try:
-                    # Crop and process image
-                    lp_image = crop_image(frame, list(map(int, detector_box)))
-
-                    # Save cropped image
-                    cropped_image_path = f"{cropped_dir}tracked_plate_{track_id}_frame_{frame_count}.png"
-                    cv2.imwrite(cropped_image_path, lp_image)
-
-                    # Upscale and process
-                    lp_image = upscaler(lp_image)
-                    lp_image = image_processing(lp_image)
-
-                    # OCR
-                    lp_text, confidence = ocr(lp_image)
-                    text_filtered = re.sub(r'(?<!\s)[^A-Z0-9-\s](?!\s)', ' ', lp_text)
-
-                    if "OCR failed" in lp_text:
-                        continue
-
-
-                    # Append results with tracking ID
-                    results.append({
-                        "is_tracked": True,
-                        "frame": frame_count,
-                        "fps": fps,
-                        "time": time_str,
-                        "track_id": int(track_id),  # Add tracking ID
-                        "image": cropped_image_path,  # Path to cropped image
-                        "confidence": confidence,
-                        "box": [x1, y1, x2, y2],
-                        "lp_text": lp_text,
-                        "text_filtered": text_filtered
-                    })
+                if detector.obb:
+                    plate_corners.append(box.xyxyxyxy[0].cpu().numpy())
+                bounding_boxes.append([x1, y1, x2, y2])
 
-                except Exception as e:
-                    print(f"Error processing tracked plate {track_id} in frame {frame_count}: {e}")
-                    continue
-        frame_count += 1
+            except Exception as e:
+                print(f"Error processing plate in frame {frame_index}: {e}")
+                continue
 
-    cap.release()
-    if (len(results) == 0):
-        print("No license plates detected in the video.")
-    else:
+        # Update the tracker, returns the confirmed tracks of this frame
+        with timings.time("track"):
+            tracked_objects = tracker.update(bounding_boxes, frame)
+        track_ids = [track_id for track_id, _ in tracked_objects]
+        tracker_boxes = [tracker_box for _, tracker_box in tracked_objects]
+
+        # Every detector box is assigned to at most one track (track_id, index of the detector box)
+        matched = [(track_ids[t], k) for t, k, _ in match_boxes(tracker_boxes, bounding_boxes, match_iou)]
+
+        # OBB plates of the frame are rectified together, straight to the recognizer input size
+        warped = None
+        if detector.obb and matched:
+            try:
+                with timings.time("crop", len(matched)):
+                    warped = warp_plates(frame, [plate_corners[k] for _, k in matched], ocr.input_size)
+            except Exception as e:
+                print(f"Rectifying the plates of frame {frame_index} failed: {e}")
+
+        tracked_plates = []
+        for m, (track_id, detector_index) in enumerate(matched):
+            # Use YOLO bounding box (not DeepSORT's predicted one)
+            box = list(map(int, bounding_boxes[detector_index]))
+            try:
+                if warped is not None:
+                    lp_image = warped[m]
+                else:
+                    with timings.time("crop"):
+                        lp_image = crop_image(frame, box)
+
+                # Skip OCR for tracks that already have a stable reading
+                if aggregator.observe(track_id, frame_index, position, box, lp_image):
+                    tracked_plates.append((track_id, box, lp_image, warped is not None))
+            except Exception as e:
+                print(f"Error processing tracked plate {track_id} in frame {frame_index}: {e}")
+                continue
+
+        return frame_index, raw_results, tracked_plates
+
+    # Recognition stage: runs in the worker pool
+    def recognize(job):
+        frame_index, results, tracked_plates = job
+        time_str = format_timestamp(frame_index, fps)
+
+        plates = []
+        rectified = any(is_rectified for _, _, _, is_rectified in tracked_plates)
+        for track_id, box, lp_image, is_rectified in tracked_plates:
+            try:
+                # Save cropped image
+                with timings.time("write"):
+                    cropped_image_path = crop_store.save(f"{run_id}_track_{track_id}_frame_{frame_index}", lp_image)
+
+                # Upscale and process, unless it is done on the whole batch
+                if not fused:
+                    # Without a recognizer input size, rectified plates keep their size in the frame
+                    if not is_rectified or ocr.input_size is None:
+                        with timings.time("upscale"):
+                            lp_image = upscaler(lp_image)
+                    with timings.time("preprocess"):
+                        lp_image = image_processing(lp_image, rectified=is_rectified)
+
+                plates.append((track_id, box, lp_image, cropped_image_path))
+
+            except Exception as e:
+                print(f"Error processing tracked plate {track_id} in frame {frame_index}: {e}")
+                continue
+
+        # OCR for all tracked plates of the frame in one batch
+        ocr_results = read_plates(ocr, image_processing, [lp_image for _, _, lp_image, _ in plates], fused, char_confidences=True, rectified=rectified)
+
+        for (track_id, box, lp_image, cropped_image_path), (lp_text, confidence, char_confidences) in zip(plates, ocr_results):
+            if "OCR failed" in lp_text:
+                continue
+            text_filtered = re.sub(r'(?<!\s)[^A-Z0-9-\s](?!\s)', ' ', lp_text)
+
+            result = {
+                "is_tracked": True,
+                "frame": frame_index,
+                "fps": fps,
+                "time": time_str,
+                "track_id": int(track_id),  # Add tracking ID
+                "image": cropped_image_path,  # Path to cropped image
+                "confidence": confidence,
+                "box": box,
+                "lp_text": lp_text,
+                "text_filtered": text_filtered
+            }
+
+            # Aggregated tracks are reported once at the end of the video
+            if aggregator.enabled:
+                aggregator.add_reading(track_id, dict(result, char_confidences=char_confidences))
+            else:
+                results.append(result)
         return results
 
+    pipeline = VideoPipeline(
+        decode,
+        detect,
+        track,
+        recognize,
+        batch_size=batch_size,
+        queue_size=pipeline_config.get("queue_size", 16),
+        workers=pipeline_config.get("ocr_workers", 2),
+    )
+
+    # Tracks are reported once the tracker dropped them. The tracker counts processed frames, not
+    # frame indices, which jump by more than the sampling step when a live stream drops frames.
+    max_track_gap = max_age + 1
+
+    stages = pipeline.run()
+    try:
+        # Results arrive in frame order, the same order as track() numbered the frames
+        for position, (frame_index, frame_results) in enumerate(stages):
+            timings.count("frames")
+            if aggregator.enabled:
+                frame_results = frame_results + aggregator.finished(position, max_track_gap)
+            if on_frame:
+                on_frame(frame_index, frame_results)
+            yield from frame_results
+    finally:
+        stages.close()
+
+    if aggregator.enabled:
+        yield from aggregator.results()
+
 
 def main():
     with open('./config/config.yaml', 'r') as file:
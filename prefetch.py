@@ -0,0 +1,13 @@
+import yaml
+
+from modules.model_store import ModelStore
+
+def main():
+    with open('./config/config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+
+    # Downloads every model into the store, needs network access once
+    ModelStore(config["model_store"]).prefetch()
+
+if __name__ == "__main__":
+    main()
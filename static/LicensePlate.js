@@ -109,6 +109,14 @@ class LicensePlate {
 
 // Function to add a license plate to the list, if it already exists add the frame and bbox
 function addLicensePlate(plateItem) {
+    // Aggregated tracks carry all frames and boxes of the track in one result
+    if (plateItem.frames !== undefined) {
+        plateItem.frames.forEach((frame, index) => {
+            addLicensePlate({ ...plateItem, frames: undefined, frame: frame, box: plateItem.boxes[index] });
+        });
+        return;
+    }
+
     const trackID = plateItem.track_id || licensePlates.length + 1;
     // Check if the license plate already exists in the array
     let existingLicensePlate = null;
@@ -52,11 +52,7 @@ function runInference() {
                 return;
             }
             console.log("Upload success:", data);
-            processResults({
-                file_url: localImageUrl || data.file_url,
-                filename: data.filename,
-                results: data.results,
-            });
+            waitForJob(data.job_id, localImageUrl || data.file_url, data.filename);
         })
         .catch((error) => {
             console.error("Upload error:", error);
@@ -64,6 +60,40 @@ function runInference() {
 
 }
 
+// Follow an inference job: progress arrives via Socket.IO (the server sends the current state on join),
+// partial results are polled incrementally and the final results once the job is done
+function waitForJob(jobId, fileUrl, filename) {
+    socket.emit("join_job", { job_id: jobId });
+
+    let received = [];
+    const poll = setInterval(() => {
+        fetch(`/jobs/${jobId}?since=${received.length}`)
+            .then((response) => response.json())
+            .then((job) => {
+                if (job.status === "done") {
+                    clearInterval(poll);
+                    // The final results replace the partial ones (e.g. aggregated tracks)
+                    return fetch(`/jobs/${jobId}`)
+                        .then((response) => response.json())
+                        .then((finished) => processResults({
+                            file_url: fileUrl,
+                            filename: filename,
+                            results: finished.results,
+                        }));
+                } else if (job.status === "failed" || job.error) {
+                    clearInterval(poll);
+                    document.getElementById("progressContainer").style.display = "none";
+                    alert(`Error during inference: ${job.error}`);
+                } else {
+                    received = received.concat(job.results);
+                }
+            })
+            .catch((error) => {
+                console.error("Job status error:", error);
+            });
+    }, 1000);
+}
+
 function processResults(results) {
     document.getElementById("progressContainer").style.display = "none";
     const uploadContainer = document.getElementById("uploadContainer");
@@ -0,0 +1,192 @@
+import copy
+import csv
+import itertools
+import json
+from collections import defaultdict
+
+import cv2
+import yaml
+
+from eval import detect_images, iter_images, score_predictions, labeled_boxes, crop_plates, upscale_plates, process_plates, read_prepared_plates
+from modules.model_store import model_store
+from modules.ocr import OCR_Module
+from modules.upscaling import Upscaler
+from modules.image_processing import Processing
+
+STAGES = ["crop", "upscale", "preprocess", "ocr"]
+
+def apply_overrides(config, overrides):
+    """Copy of config with overrides like {"upscaler.type": "bicubic"} applied."""
+    config = copy.deepcopy(config)
+    for path, value in overrides.items():
+        *parents, key = path.split(".")
+        section = config
+        for parent in parents:
+            section = section[parent]
+        section[key] = value
+    return config
+
+def expand_sweep(sweep):
+    """All combinations of the grid values, followed by the explicitly listed configs."""
+    overrides = []
+    grid = sweep.get("grid") or {}
+    if grid:
+        keys = list(grid)
+        for values in itertools.product(*(grid[key] for key in keys)):
+            overrides.append(dict(zip(keys, values)))
+    overrides.extend(sweep.get("configs") or [])
+    return overrides
+
+def config_key(*sections):
+    return json.dumps(sections, sort_keys=True)
+
+def run_sweep(config, sweep):
+    """
+    Evaluate every config of the sweep in one pass over the test set.
+    Plates go through the same crop, upscale, process and read steps as eval.py.
+    Detection runs once per image, cropping once per recognizer input size, upscaling,
+    processing and OCR once per distinct prefix of settings, so configs that only differ
+    in later stages share work.
+    """
+    runs = []
+    for overrides in expand_sweep(sweep):
+        run_config = apply_overrides(config, overrides)
+        runs.append({
+            "name": ", ".join(f"{key}={value}" for key, value in overrides.items()) or "base",
+            "upscaler": run_config["upscaler"],
+            "image_processing": run_config["image_processing"],
+            "recognizer": run_config["recognizer"],
+            "cer": 0.0,
+            "wer": 0.0,
+            "cases": 0,
+            "correct": 0,
+            "missed": 0,
+            "time": defaultdict(float),
+        })
+
+    # Every module is created once and shared by all runs with the same settings
+    upscalers = {}
+    processings = {}
+    recognizers = {}
+    for run in runs:
+        upscalers.setdefault(config_key(run["upscaler"]), Upscaler(run["upscaler"]))
+        processings.setdefault(config_key(run["image_processing"]), Processing(run["image_processing"]))
+        key = config_key(run["recognizer"])
+        if key not in recognizers:
+            recognizers[key] = OCR_Module(run["recognizer"], model_store(config))
+
+    images = 0
+    for image_path, label, boxes in detect_images(config, iter_images(config["data_path"])):
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        images += 1
+        # Same plates as in eval.py, only the ones matching a labeled box with eval.match_labels
+        boxes, _ = labeled_boxes(image, label, boxes, config["label_path"], config["eval"])
+
+        # Intermediate results of this image per settings prefix: (plates or texts, {stage: seconds})
+        cropped = {}
+        upscaled = {}
+        prepared = {}
+        read = {}
+        for run in runs:
+            ocr = recognizers[config_key(run["recognizer"])]
+            processing = processings[config_key(run["image_processing"])]
+            fused = processing.fused and ocr.input_size is not None
+
+            crop_key = config_key(ocr.input_size)
+            if crop_key not in cropped:
+                crop_time = {}
+                cropped[crop_key] = (crop_plates(image, boxes, ocr.input_size, crop_time), crop_time)
+            (plates, rectified), crop_time = cropped[crop_key]
+
+            # The fused path does not upscale, all of its runs share the cropped plates
+            upscale_key = config_key(ocr.input_size, None if fused else run["upscaler"])
+            if upscale_key not in upscaled:
+                upscale_time = {}
+                lp_images = upscale_plates(plates, rectified, ocr.input_size, upscalers[config_key(run["upscaler"])], fused, upscale_time)
+                upscaled[upscale_key] = (lp_images, upscale_time)
+            upscaled_images, upscale_time = upscaled[upscale_key]
+
+            prepare_key = config_key(ocr.input_size, None if fused else run["upscaler"], run["image_processing"], fused)
+            if prepare_key not in prepared:
+                prepare_time = {}
+                lp_images = process_plates(upscaled_images, rectified, processing, fused, prepare_time)
+                prepared[prepare_key] = (lp_images, prepare_time)
+            lp_images, prepare_time = prepared[prepare_key]
+
+            read_key = config_key(ocr.input_size, None if fused else run["upscaler"], run["image_processing"], fused, run["recognizer"])
+            if read_key not in read:
+                read_time = {}
+                read[read_key] = (read_prepared_plates(ocr, processing, lp_images, fused, rectified, read_time), read_time)
+            predictions, read_time = read[read_key]
+
+            for stage_times in (crop_time, upscale_time, prepare_time, read_time):
+                for stage, seconds in stage_times.items():
+                    run["time"][stage] += seconds
+
+            scores = score_predictions(label, predictions)
+            if scores is None:
+                run["missed"] += 1
+                continue
+            cer, wer, _ = scores
+            run["cer"] += cer
+            run["wer"] += wer
+            run["cases"] += 1
+            if wer == 0:
+                run["correct"] += 1
+
+    return summarize(runs, images)
+
+def summarize(runs, images):
+    rows = []
+    for run in runs:
+        cases = max(run["cases"], 1)
+        row = {
+            "config": run["name"],
+            "cer": run["cer"] / cases,
+            "wer": run["wer"] / cases,
+            "accuracy": run["correct"] / cases,
+            "missed": run["missed"],
+        }
+        # Mean latency per image in ms, as if the config ran on its own
+        for stage in STAGES:
+            row[f"{stage}_ms"] = 1000 * run["time"][stage] / max(images, 1)
+        row["total_ms"] = sum(row[f"{stage}_ms"] for stage in STAGES)
+        rows.append(row)
+    rows.sort(key=lambda row: (-row["accuracy"], row["cer"]))
+    return rows
+
+def print_table(rows):
+    if not rows:
+        print("No configs to evaluate.")
+        return
+    width = max(len(row["config"]) for row in rows)
+    columns = [column for column in rows[0] if column != "config"]
+    print(f"{'config':<{width}}  " + "  ".join(f"{column:>10}" for column in columns))
+    for row in rows:
+        values = "  ".join(f"{row[column]:>10.3f}" if isinstance(row[column], float) else f"{row[column]:>10}" for column in columns)
+        print(f"{row['config']:<{width}}  {values}")
+
+def write_csv(rows, path):
+    if not rows:
+        return
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main():
+    with open('./config/config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+    with open('./config/sweep.yaml', 'r') as file:
+        sweep = yaml.safe_load(file)
+
+    rows = run_sweep(config, sweep)
+    print_table(rows)
+    if sweep.get("output"):
+        write_csv(rows, sweep["output"])
+        print(f"Results written to {sweep['output']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+import yaml
 from modules.detection import LPD_Module
+from modules.model_store import model_store
 
 def train():
     detector = LPD_Module("checkpoints/pretrained/yolo11n.pt")
@@ -7,7 +9,11 @@ def train():
     #print(results)
 
 def train_obb():
-    detector = LPD_Module("yolo11n-obb.pt", verbose=False)
+    with open('./config/config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+    # Pretrained weights from the local model store if enabled, otherwise ultralytics downloads them
+    store = model_store(config)
+    detector = LPD_Module(store.yolo_path("yolo11n-obb.pt") if store else "yolo11n-obb.pt", verbose=False)
     #results = detector.model.train(data="config/data.yaml", epochs=400, imgsz=640, device=0, val=True, single_cls=True, batch=32)
     results = detector.model.train(cfg="config/train_obb.yaml")
 if __name__ == "__main__":
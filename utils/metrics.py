@@ -0,0 +1,143 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# Plate formats of the test set, checked in order against the raw labels (file names)
+PLATE_FORMATS = [
+    ("FR", re.compile(r'^[A-Z]{2}-\d{3}-[A-Z]{2}$')),
+    ("NL", re.compile(r'^[A-Z0-9]{1,3}-[A-Z0-9]{1,3}-[A-Z0-9]{1,3}$')),
+    ("DE", re.compile(r'^[A-ZÄÖÜ]{1,3}_[A-Z]{1,2}_\d{1,4}(_?[EH])?$')),
+    ("CH", re.compile(r'^(AG|AI|AR|BE|BL|BS|FR|GE|GL|GR|JU|LU|NE|NW|OW|SG|SH|SO|SZ|TG|TI|UR|VD|VS|ZG|ZH)_\d{1,6}$')),
+]
+
+def edit_distance(a, b):
+    """
+    Levenshtein distance between two sequences (strings or word lists).
+    Bit-parallel algorithm of Myers/Hyyrö: one pass over b with a bit vector per column,
+    O(len(b)) big-int operations instead of the O(len(a) * len(b)) table.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    m = len(b)
+    if m == 0:
+        return len(a)
+
+    # The shorter sequence is the bit pattern
+    peq = {}
+    for i, item in enumerate(b):
+        peq[item] = peq.get(item, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv = mask
+    mv = 0
+    score = m
+    for item in a:
+        eq = peq.get(item, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh = mh << 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return score
+
+def edit_distances(predictions, ground_truths):
+    """Edit distances of many prediction/ground truth pairs as an array."""
+    return np.fromiter((edit_distance(gt, pred) for pred, gt in zip(predictions, ground_truths)),
+                       dtype=np.int64, count=len(ground_truths))
+
+def character_error_rates(predictions, ground_truths):
+    """CER per pair, inf for empty ground truths."""
+    lengths = np.array([len(gt) for gt in ground_truths], dtype=np.float64)
+    distances = edit_distances(predictions, ground_truths).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(lengths > 0, distances / np.maximum(lengths, 1), math.inf)
+
+def word_error_rates(predictions, ground_truths):
+    """WER per pair, inf for empty ground truths."""
+    return character_error_rates([pred.split() for pred in predictions], [gt.split() for gt in ground_truths])
+
+def align(gt, pred):
+    """
+    Character alignment of minimal edit distance as (gt_char, pred_char) pairs.
+    Insertions have an empty gt_char, deletions an empty pred_char.
+    """
+    m, n = len(gt), len(pred)
+    dp = np.zeros((m + 1, n + 1), dtype=np.int32)
+    dp[:, 0] = np.arange(m + 1)
+    dp[0, :] = np.arange(n + 1)
+    pred_array = np.array(list(pred)) if n else np.array([], dtype=str)
+    for i in range(1, m + 1):
+        # Substitutions and deletions are vectorized per row, insertions need the running minimum
+        cost = (pred_array != gt[i - 1]).astype(np.int32)
+        row = np.minimum(dp[i - 1, 1:] + 1, dp[i - 1, :-1] + cost)
+        row = np.concatenate(([dp[i, 0]], row))
+        dp[i] = np.minimum.accumulate(row - np.arange(n + 1)) + np.arange(n + 1)
+
+    pairs = []
+    i, j = m, n
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and dp[i, j] == dp[i - 1, j - 1] + (gt[i - 1] != pred[j - 1]):
+            pairs.append((gt[i - 1], pred[j - 1]))
+            i, j = i - 1, j - 1
+        elif i > 0 and dp[i, j] == dp[i - 1, j] + 1:
+            pairs.append((gt[i - 1], ""))
+            i -= 1
+        else:
+            pairs.append(("", pred[j - 1]))
+            j -= 1
+    return pairs[::-1]
+
+def confusion_matrix(predictions, ground_truths):
+    """
+    Per-character confusion counts over all pairs.
+    Returns (labels, matrix) with matrix[gt_index, pred_index], "" stands for a missing character.
+    """
+    counts = Counter()
+    for pred, gt in zip(predictions, ground_truths):
+        counts.update(align(gt, pred))
+    labels = sorted({char for pair in counts for char in pair})
+    index = {char: i for i, char in enumerate(labels)}
+    matrix = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    for (gt_char, pred_char), count in counts.items():
+        matrix[index[gt_char], index[pred_char]] = count
+    return labels, matrix
+
+def top_confusions(labels, matrix, count=10):
+    """The most frequent (gt_char, pred_char, count) errors of a confusion matrix."""
+    errors = matrix.copy()
+    np.fill_diagonal(errors, 0)
+    flat = np.argsort(errors, axis=None)[::-1][:count]
+    rows, columns = np.unravel_index(flat, errors.shape)
+    return [(labels[r], labels[c], int(errors[r, c])) for r, c in zip(rows, columns) if errors[r, c] > 0]
+
+def plate_format(label):
+    for name, pattern in PLATE_FORMATS:
+        if pattern.match(label):
+            return name
+    return "other"
+
+def accuracy_by(keys, correct):
+    """Accuracy per group: {key: {"count": n, "accuracy": a}}"""
+    groups = defaultdict(list)
+    for key, is_correct in zip(keys, correct):
+        groups[key].append(is_correct)
+    return {key: {"count": len(values), "accuracy": float(np.mean(values))} for key, values in sorted(groups.items())}
+
+def accuracy_by_length(predictions, ground_truths):
+    correct = [pred == gt for pred, gt in zip(predictions, ground_truths)]
+    return accuracy_by([len(gt) for gt in ground_truths], correct)
+
+def accuracy_by_format(predictions, ground_truths, labels):
+    """labels: raw labels with separators, used to determine the plate format"""
+    correct = [pred == gt for pred, gt in zip(predictions, ground_truths)]
+    return accuracy_by([plate_format(label) for label in labels], correct)
@@ -1,7 +1,14 @@
+import os
+import hashlib
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
 def crop_image(image,xyxy, offset_left=13, offset_right=30):
     x1, y1, x2, y2 = xyxy
     return image[y1:y2, (x1 + ((x2-x1)//offset_left)) : (x2 - ((x2-x1)//offset_right)), :].copy()
@@ -35,6 +42,80 @@ def four_point_transform(image, pts):
     warped = cv2.warpPerspective(image, M, (maxWidth, maxHeight))
     return warped
 
+def order_points_batch(pts):
+    """order_points for (N, 4, 2) corners: top-left, top-right, bottom-right, bottom-left"""
+    s = pts.sum(axis=2)
+    diff = np.diff(pts, axis=2)[..., 0]
+    index = np.arange(len(pts))
+    return np.stack([
+        pts[index, np.argmin(s, axis=1)],
+        pts[index, np.argmin(diff, axis=1)],
+        pts[index, np.argmax(s, axis=1)],
+        pts[index, np.argmax(diff, axis=1)],
+    ], axis=1).astype(np.float32)
+
+def perspective_transforms(src, dst):
+    """
+    Homographies mapping the 4 points src (4, 2) onto each of dst (N, 4, 2), as (N, 3, 3).
+    Solves all N linear systems at once instead of calling cv2.getPerspectiveTransform per plate.
+    """
+    n = len(dst)
+    x, y = src[:, 0], src[:, 1]
+    u, v = dst[..., 0], dst[..., 1]
+    A = np.zeros((n, 8, 8), dtype=np.float64)
+    A[:, 0::2, 0] = x
+    A[:, 0::2, 1] = y
+    A[:, 0::2, 2] = 1
+    A[:, 0::2, 6] = -u * x
+    A[:, 0::2, 7] = -u * y
+    A[:, 1::2, 3] = x
+    A[:, 1::2, 4] = y
+    A[:, 1::2, 5] = 1
+    A[:, 1::2, 6] = -v * x
+    A[:, 1::2, 7] = -v * y
+    b = np.stack([u, v], axis=2).reshape(n, 8, 1)
+    h = np.linalg.solve(A, b)[..., 0]
+    return np.concatenate([h, np.ones((n, 1))], axis=1).reshape(n, 3, 3)
+
+def plate_sizes(corners):
+    """(h, w) of every plate like four_point_transform: the longer of the opposite edges."""
+    tl, tr, br, bl = np.moveaxis(order_points_batch(corners), 1, 0)
+    widths = np.maximum(np.linalg.norm(br - bl, axis=1), np.linalg.norm(tr - tl, axis=1))
+    heights = np.maximum(np.linalg.norm(tr - br, axis=1), np.linalg.norm(tl - bl, axis=1))
+    return [(max(int(h), 1), max(int(w), 1)) for h, w in zip(heights, widths)]
+
+def warp_plates(image, corners, size=None):
+    """
+    Perspective-rectify all plates of an image from their OBB corners (N, 4, 2).
+    size: (h, w) of the output, e.g. the recognizer input size. All plates then share one
+    remap call on the image, with the sampling maps of every plate stacked on top of each other.
+    Without a size every plate keeps its own size. Returns a list of images.
+    """
+    corners = np.asarray(corners, dtype=np.float32).reshape(-1, 4, 2)
+    if len(corners) == 0:
+        return []
+    if size is None:
+        return [warp_plates(image, plate, plate_size)[0] for plate, plate_size in zip(corners, plate_sizes(corners))]
+
+    h, w = size
+    src = order_points_batch(corners)
+    dst = np.array([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]], dtype=np.float32)
+    # Maps every output pixel back into the image
+    homographies = perspective_transforms(dst, src)
+    ys, xs = np.mgrid[0:h, 0:w]
+    grid = np.stack([xs.ravel(), ys.ravel(), np.ones(h * w)])
+    mapped = homographies @ grid
+    map_x = (mapped[:, 0] / mapped[:, 2]).reshape(-1, w).astype(np.float32)
+    map_y = (mapped[:, 1] / mapped[:, 2]).reshape(-1, w).astype(np.float32)
+    warped = cv2.remap(image, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return list(warped.reshape(len(corners), h, w, *image.shape[2:]))
+
+def plate_images(image, boxes, size=None):
+    """Plate images for boxes as [x1, y1, x2, y2] (cropped) or 4 OBB corners (rectified)."""
+    if boxes and np.asarray(boxes[0]).shape == (4, 2):
+        return warp_plates(image, boxes, size)
+    return [crop_image(image, map(int, box)) for box in boxes]
+
 def detect_plate_corners(roi):
     gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
     gray = cv2.GaussianBlur(gray, (5, 5), 0)
@@ -107,4 +188,102 @@ def calculate_iou(box1, box2):
     
     # Calculate IoU
     iou = intersection_area / float(box1_area + box2_area - intersection_area)
-    return iou
\ No newline at end of file
+    return iou
+
+def iou_matrix(boxes1, boxes2):
+    """IoU of every pair of boxes (N, 4) x (M, 4) in format [x1, y1, x2, y2], as (N, M)."""
+    boxes1 = np.asarray(boxes1, dtype=np.float64).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float64).reshape(-1, 4)
+    top_left = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    bottom_right = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    union = area1[:, None] + area2[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+def match_boxes(boxes1, boxes2, threshold=0.1):
+    """
+    One-to-one assignment between two sets of boxes by IoU.
+    Uses the Hungarian algorithm if scipy is installed, otherwise greedy matching in order
+    of decreasing IoU. Returns (i, j, iou) for every pair with an IoU of at least threshold.
+    """
+    ious = iou_matrix(boxes1, boxes2)
+    if ious.size == 0:
+        return []
+
+    if linear_sum_assignment is not None:
+        rows, columns = linear_sum_assignment(-ious)
+        pairs = zip(rows, columns)
+    else:
+        pairs = []
+        used_rows, used_columns = set(), set()
+        for flat in np.argsort(-ious, axis=None):
+            i, j = np.unravel_index(flat, ious.shape)
+            if ious[i, j] < threshold:
+                break
+            if i in used_rows or j in used_columns:
+                continue
+            used_rows.add(i)
+            used_columns.add(j)
+            pairs.append((i, j))
+    return [(int(i), int(j), float(ious[i, j])) for i, j in pairs if ious[i, j] >= threshold]
+
+def yolo_label_boxes(label_path, width, height):
+    """
+    Boxes [x1, y1, x2, y2] in pixels from a YOLO label file, normalized lines of either
+    class cx cy w h or, for OBB labels, class x1 y1 x2 y2 x3 y3 x4 y4 (bounds of the corners).
+    """
+    boxes = []
+    with open(label_path, 'r') as file:
+        for line in file:
+            values = line.split()
+            if len(values) >= 9:
+                corners = np.asarray(values[1:9], dtype=np.float64).reshape(4, 2) * [width, height]
+                boxes.append(box_bounds(corners))
+            elif len(values) >= 5:
+                cx, cy, w, h = (float(value) for value in values[1:5])
+                boxes.append([(cx - w / 2) * width, (cy - h / 2) * height, (cx + w / 2) * width, (cy + h / 2) * height])
+    return boxes
+
+def box_bounds(box):
+    """[x1, y1, x2, y2] of a box given as [x1, y1, x2, y2] or as 4 OBB corners."""
+    points = np.asarray(box, dtype=np.float64)
+    if points.shape == (4, 2):
+        return [*points.min(axis=0), *points.max(axis=0)]
+    return points.tolist()
+
+def get_rss_bytes():
+    """
+    Return the current resident set size of this process in bytes.
+    Falls back to the peak RSS on platforms without /proc.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's content, used as cache key for checkpoints and images.
+    Directories (e.g. exported OpenVINO models) hash the names and content of all their files.
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    else:
+        files = [path]
+    for file_path in files:
+        if len(files) > 1 or file_path != path:
+            digest.update(os.path.relpath(file_path, path).encode())
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                digest.update(chunk)
+    return digest.hexdigest()